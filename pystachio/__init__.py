@@ -9,7 +9,8 @@ if sys.version_info < (2, 6, 5):
 from pystachio.typing import (
   Type,
   TypeCheck,
-  TypeFactory)
+  TypeFactory,
+  TypeRegistry)
 
 from pystachio.base import Environment
 from pystachio.parsing import MustacheParser
@@ -30,3 +31,6 @@ from pystachio.composite import (
   Provided,
   Required,
   Struct)
+
+from pystachio.batch import render_many
+from pystachio.session import RenderSession
@@ -0,0 +1,72 @@
+"""
+  Asynchronous interpolation against scopes backed by external services.
+
+  An AsyncNamable fetches the values of many Refs in one call.  ainterpolate
+  finds every Ref an object needs bound, fetches them from all providers
+  concurrently, and repeats for any Refs the fetched values introduce; the
+  object is then interpolated synchronously against the fetched values:
+
+    class Secrets(AsyncNamable):
+      async def fetch(self, refs):
+        return await secret_store.get_many([ref.address() for ref in refs])
+
+    job, unbound = await job.ainterpolate(Secrets(), ClusterMetadata())
+
+  Requires Python 3.5 or later.
+"""
+
+import asyncio
+
+from pystachio.base import Environment
+from pystachio.naming import Ref
+
+
+class AsyncNamable(object):
+  """
+    A scope whose values are fetched asynchronously, in batches.
+  """
+
+  async def fetch(self, refs):
+    """
+      Fetch the values of a list of Refs.  Return a dict mapping each Ref (or its
+      address) that this scope binds to its value: a string, number, dict or
+      Object, as for Environment.  Refs that are not bound are omitted.
+    """
+    raise NotImplementedError
+
+
+async def _fetch(provider, refs):
+  fetched = await provider.fetch(list(refs))
+  return dict((Ref.wrap(ref), value) for ref, value in fetched.items())
+
+
+async def prefetch(obj, *providers):
+  """
+    Fetch the values of the Refs obj (transitively) needs bound from providers,
+    returning an Environment of the values.  Each round of Refs is fetched with
+    one call per provider, with the providers called concurrently.  When more
+    than one provider binds a Ref, the first of them in providers wins.
+  """
+  environment = Environment()
+  requested = set()
+  while True:
+    refs = [ref for ref in obj.bind(environment).free_refs() if ref not in requested]
+    if not refs or not providers:
+      return environment
+    requested.update(refs)
+    results = await asyncio.gather(*[_fetch(provider, refs) for provider in providers])
+    bindings = {}
+    for fetched in reversed(results):
+      bindings.update(fetched)
+    if not bindings:
+      return environment
+    environment = Environment(environment, bindings)
+
+
+async def ainterpolate(obj, *providers):
+  """
+    Interpolate obj with its unbound Refs fetched from providers (AsyncNamables),
+    returning the 2-tuple of interpolate().
+  """
+  environment = await prefetch(obj, *providers)
+  return obj.bind(environment).interpolate()
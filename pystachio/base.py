@@ -1,10 +1,12 @@
 from pprint import pformat
 
 from pystachio.compatibility import Compatibility
+from pystachio.instrumentation import Instrumentation
 from pystachio.naming import (
   Ref,
   Namable)
 from pystachio.parsing import MustacheParser
+from pystachio.tracing import ResolutionTracer
 from pystachio.typing import (
   TypeCheck,
   TypeEnvironment)
@@ -35,16 +37,23 @@ class Environment(Namable):
       rkey = Ref.wrap(key)
       if isinstance(val, Environment):
         for vkey, vval in val._table.items():
-          self._table[rkey + vkey] = vval
+          self._mount(rkey + vkey, vval)
       else:
-        self._table[rkey] = val
+        self._mount(rkey, val)
 
   def _assimilate_table(self, mt):
     for key, val in mt._table.items():
-      self._table[key] = val
+      self._mount(key, val)
+
+  def _mount(self, key, val):
+    self._table[key] = val
+    self._trie = None
 
   def __init__(self, *dicts, **kw):
     self._table = {}
+    # Prefix trie over the components of the keys in _table that mount Namables,
+    # built on first use (see _build_trie.)
+    self._trie = None
     for d in list(dicts) + [kw]:
       if isinstance(d, dict):
         self._assimilate_dictionary(d)
@@ -53,6 +62,45 @@ class Environment(Namable):
       else:
         raise ValueError("Environment expects dict or Environment, got %s" % repr(d))
 
+  def _build_trie(self):
+    """
+      Build the prefix trie over the keys mounting Namables.  Each node maps
+      components to child nodes, and None to the key mounted at that node (if any.)
+      Only Namables can be descended into, so environments of plain values (such
+      as the self scopes of most Structs) keep a small trie, or none at all until
+      a dotted Ref is looked up in them.
+    """
+    trie = {}
+    for key, value in self._table.items():
+      if isinstance(value, Namable):
+        node = trie
+        for component in key.components():
+          node = node.setdefault(component, {})
+        node[None] = key
+    return trie
+
+  def _mounts(self, ref):
+    """
+      Yield (key, subscope, scope) for every Namable mounted at a proper prefix
+      of ref, longest prefix first.
+    """
+    components = ref.components()
+    if len(components) < 2:
+      return
+    node = self._trie
+    if node is None:
+      node = self._trie = self._build_trie()
+    prefixes = []
+    for component in components[:-1]:
+      node = node.get(component)
+      if node is None:
+        break
+      key = node.get(None)
+      if key is not None:
+        prefixes.append(key)
+    for key in reversed(prefixes):
+      yield key, Ref(components[len(key.components()):]), self._table[key]
+
   # Duck-typed against provides classmethod.
   #
   # TODO(wickman) provides should probably somehow be integrated with find in this case.
@@ -60,50 +108,152 @@ class Environment(Namable):
     assert isinstance(ref, Ref)
     if ref in self._table:
       return True
-    targets = [key for key in self._table if Ref.subscope(key, ref)]
-    if not targets:
-      return False
-    else:
-      for key in sorted(targets, reverse=True):
-        scope = self._table[key]
-        if not isinstance(scope, Namable):
-          continue
-        subscope = Ref.subscope(key, ref)
-        # If subscope is empty, then we should've found it in the ref table.
-        assert not subscope.is_empty()
-        if scope.provides(subscope):
-          return True
+    for _, subscope, scope in self._mounts(ref):
+      if scope.provides(subscope):
+        return True
     return False
 
   def find(self, ref):
+    if Instrumentation._ENABLED:
+      Instrumentation.count('environment.find')
     if ref in self._table:
       return self._table[ref]
-    targets = [key for key in self._table if Ref.subscope(key, ref)]
-    if not targets:
-      raise Namable.NotFound(self, ref)
-    else:
-      for key in sorted(targets, reverse=True):
-        scope = self._table[key]
-        if not isinstance(scope, Namable):
-          continue
-        subscope = Ref.subscope(key, ref)
-        # If subscope is empty, then we should've found it in the ref table.
-        assert not subscope.is_empty()
-        try:
-          resolved = scope.find(subscope)
-          return resolved
-        except Namable.Error as e:
-          continue
+    for _, subscope, scope in self._mounts(ref):
+      if Instrumentation._ENABLED:
+        Instrumentation.count('environment.find.scan')
+      try:
+        return scope.find(subscope)
+      except Namable.Error:
+        continue
+    if Instrumentation._ENABLED:
+      Instrumentation.count('environment.find.miss')
+    raise Namable.NotFound(self, ref)
+
+  def find_mount(self, ref):
+    """
+      Like find, but return a 2-tuple of the key mounted in this Environment that
+      satisfied ref (ref itself, or the key of a Namable mounted at a prefix of
+      it) and the value found.
+    """
+    if ref in self._table:
+      return ref, self._table[ref]
+    for key, subscope, scope in self._mounts(ref):
+      try:
+        return key, scope.find(subscope)
+      except Namable.Error:
+        continue
     raise Namable.NotFound(self, ref)
 
   def __repr__(self):
     return 'Environment(%s)' % pformat(self._table)
 
 
+class ScopeChain(object):
+  """
+    An immutable, persistent sequence of scopes (Namables.)
+
+    prepend and append are O(1) and return new chains sharing structure with
+    this one, so scoping an object to its parent never copies the parent's
+    scopes.  The flattened tuple of scopes is computed on first use and cached.
+  """
+  __slots__ = ('_left', '_right', '_length', '_flattened', '_memo')
+
+  def __init__(self, scopes=(), left=None, right=None):
+    self._memo = None
+    if left is None:
+      self._left = self._right = None
+      self._flattened = tuple(scopes)
+      self._length = len(self._flattened)
+    else:
+      self._left, self._right = left, right
+      self._flattened = None
+      self._length = len(left) + len(right)
+
+  @staticmethod
+  def wrap(scopes):
+    return scopes if isinstance(scopes, ScopeChain) else ScopeChain(scopes)
+
+  def prepend(self, scopes):
+    """
+      Return a new chain with scopes (a sequence or ScopeChain) ahead of this one.
+    """
+    head = ScopeChain.wrap(scopes)
+    if not head:
+      return self
+    if not self:
+      return head
+    return ScopeChain(left=head, right=self)
+
+  def append(self, scopes):
+    """
+      Return a new chain with scopes (a sequence or ScopeChain) after this one.
+    """
+    tail = ScopeChain.wrap(scopes)
+    if not tail:
+      return self
+    if not self:
+      return tail
+    return ScopeChain(left=self, right=tail)
+
+  def scopes(self):
+    """
+      Return the scopes in this chain as a tuple, in lookup order.
+    """
+    if self._flattened is None:
+      flattened, stack = [], [self]
+      while stack:
+        node = stack.pop()
+        if node._flattened is not None:
+          flattened.extend(node._flattened)
+        else:
+          stack.extend((node._right, node._left))
+      self._flattened = tuple(flattened)
+    return self._flattened
+
+  def memo(self):
+    """
+      Return a dictionary in which the results of Ref lookups in this chain may
+      be memoized.  Scopes are immutable, so it is valid for the chain's lifetime.
+    """
+    if self._memo is None:
+      self._memo = {}
+    return self._memo
+
+  def __iter__(self):
+    return iter(self.scopes())
+
+  def __len__(self):
+    return self._length
+
+  def __bool__(self):
+    return self._length > 0
+  __nonzero__ = __bool__
+
+  def __repr__(self):
+    return 'ScopeChain(%s)' % ', '.join(repr(scope) for scope in self.scopes())
+
+
+ScopeChain.EMPTY = ScopeChain()
+
+
+# Unpicklers are module-level functions, since Python 2 cannot pickle staticmethods.
+def _unpickle_object(cls, args, scopes, modulo, lazy):
+  obj = cls(*args)
+  obj._scopes = ScopeChain(scopes)
+  if modulo is not None:
+    obj._modulo = modulo
+  obj._lazy = lazy
+  return obj
+
+
 class Object(object):
   """
     Object base class, encapsulating a set of variable bindings scoped to this object.
+
+    Objects are immutable, so copy() (and therefore bind, in_scope and provided)
+    returns a lightweight view sharing the object's data and scope chain.
   """
+  __slots__ = ('_scopes', '_modulo', '_interpolated', '_lazy', '_typecheck', '_free')
 
   class CoercionError(ValueError):
     def __init__(self, src, dst):
@@ -115,9 +265,20 @@ class Object(object):
   def checker(cls, obj):
     raise NotImplementedError
 
+  @classmethod
+  def _from_json(cls, value, strict=False):
+    """
+      Construct an instance of this type from its decoded JSON representation.
+    """
+    return cls(value)
+
   def __init__(self):
-    self._scopes = []
-    self._modulo = TypeEnvironment()
+    self._scopes = ScopeChain.EMPTY
+    self._modulo = TypeEnvironment.EMPTY
+    self._interpolated = None
+    self._lazy = False
+    self._typecheck = None
+    self._free = None
 
   def get(self):
     raise NotImplementedError
@@ -132,6 +293,36 @@ class Object(object):
     """
     raise NotImplementedError
 
+  def _pickle_args(self):
+    """
+      Return the arguments from which this object's class reconstructs it.
+    """
+    raise NotImplementedError
+
+  def __reduce__(self):
+    # Pickle the constructor arguments with the bound scopes and modulo; memoized
+    # interpolations are recomputed after unpickling.
+    return (_unpickle_object, (self.__class__, self._pickle_args(), tuple(self._scopes),
+        None if self._modulo is TypeEnvironment.EMPTY else self._modulo, self._lazy))
+
+  def _view(self):
+    """
+      Return a shallow copy of this object sharing its data, scopes and modulo.
+    """
+    if Instrumentation._ENABLED:
+      Instrumentation.count('copy')
+    cls = self.__class__
+    new_self = cls.__new__(cls)
+    new_self._scopes = self._scopes
+    new_self._modulo = self._modulo
+    new_self._interpolated = None
+    new_self._lazy = self._lazy
+    new_self._typecheck = None
+    new_self._free = None
+    if cls.__dictoffset__:
+      new_self.__dict__.update(self.__dict__)
+    return new_self
+
   @staticmethod
   def translate_to_scopes(*args, **kw):
     scopes = []
@@ -146,7 +337,7 @@ class Object(object):
     """
     new_self = self.copy()
     new_scopes = Object.translate_to_scopes(*args, **kw)
-    new_self._scopes = list(reversed(new_scopes)) + new_self._scopes
+    new_self._scopes = new_self._scopes.prepend(list(reversed(new_scopes)))
     return new_self
 
   def provided(self, environment):
@@ -160,12 +351,53 @@ class Object(object):
     """
     new_self = self.copy()
     new_scopes = Object.translate_to_scopes(*args, **kw)
-    new_self._scopes = new_self._scopes + new_scopes
+    new_self._scopes = new_self._scopes.append(new_scopes)
     return new_self
 
-  def scopes(self):
+  def _scoped(self, scopes, modulo=None):
+    """
+      Equivalent to self.in_scope(*scopes).provided(modulo) for a ScopeChain,
+      sharing the chain rather than copying it.
+    """
+    new_self = self.copy()
+    new_self._scopes = new_self._scopes.append(scopes)
+    if modulo is not None:
+      new_self._modulo = new_self._modulo.merge(modulo)
+    return new_self
+
+  def scope_chain(self):
+    """
+      Return the ScopeChain in which this object is interpolated.
+    """
     return self._scopes
 
+  def lazy(self):
+    """
+      Return a view of this object in lazy mode.  Accessors on lazy views
+      (Struct attributes, List elements and Map values) return Namable children
+      as lazy views scoped to this object instead of interpolating them, so
+      dereferencing a path such as task.processes()[3].name() only interpolates
+      the leaf it reaches.
+    """
+    new_self = self.copy()
+    new_self._lazy = True
+    return new_self
+
+  def _dereference(self, child):
+    """
+      Return child, one of this object's values, as seen from within this object:
+      interpolated in this object's scope, or a lazy scoped view if this object is
+      lazy and child is Namable.
+    """
+    view = child._scoped(self.scope_chain(), self.modulo())
+    if self._lazy and isinstance(child, Namable):
+      view._lazy = True
+      return view
+    return view.interpolate()[0]
+
+  def scopes(self):
+    return list(self.scope_chain())
+
   def modulo(self):
     return self._modulo
 
@@ -173,17 +405,66 @@ class Object(object):
     """
       Type check this object.
     """
+    return self.render()[2]
+
+  def render(self):
+    """
+      Interpolate and type check this object in a single pass over its tree.
+
+      Returns a 3-tuple:
+        The interpolated object, or None if it could not be interpolated.
+        The remaining unbound Refs (as returned by interpolate.)
+        The TypeCheck for this object (as returned by check.)
+
+      The result is memoized on this instance and shared with interpolate(), so
+      interpolating and checking an object, in either order, walks its tree once.
+    """
+    if Instrumentation._ENABLED:
+      name = 'interpolate.' + self.__class__.__name__
+      Instrumentation.count(name)
+    # While a tracer is active the memo is bypassed, so that the lookups of
+    # objects rendered before tracing began are recorded too.
+    if self._typecheck is None or (
+        ResolutionTracer._ACTIVE and ResolutionTracer.current() is not None):
+      if Instrumentation._ENABLED:
+        interpolated, unbound, typecheck = Instrumentation.timed(name, self._render)
+      else:
+        interpolated, unbound, typecheck = self._render()
+      if self._typecheck is None:
+        self._typecheck = typecheck
+        if interpolated is not None:
+          self._interpolated = (interpolated, tuple(unbound))
+    if self._interpolated is None:
+      return None, [], self._typecheck
+    interpolated, unbound = self._interpolated
+    return interpolated, list(unbound), self._typecheck
+
+  def _render(self):
+    """
+      Compute the result of render() for this object.  By default, interpolate
+      this object and check the result with its class's checker.
+    """
     try:
-      si, uninterp = self.interpolate()
+      si, uninterp = self._interpolate()
     # TODO(wickman) This should probably be pushed out to the interpolate leaves.
     except (Object.CoercionError, MustacheParser.Uninterpolatable) as e:
-      return TypeCheck(False, "Unable to interpolate: %s" % e)
+      return None, [], TypeCheck(False, "Unable to interpolate: %s" % e)
     type_environment = self.modulo()
     for ref in uninterp:
       if not type_environment.covers(ref):
-        return TypeCheck(False, "Uninterpolated variables: %s" %
+        return si, uninterp, TypeCheck(False, "Uninterpolated variables: %s" %
           ' '.join('%s' % ref for ref in uninterp))
-    return self.checker(si)
+    return si, uninterp, self.checker(si)
+
+  def _visit(self, check):
+    """
+      Return render() if check, and otherwise interpolate() with a TypeCheck of
+      None, for the walks over the children of containers.
+    """
+    if check:
+      return self.render()
+    interpolated, unbound = self.interpolate()
+    return interpolated, unbound, None
 
   def __ne__(self, other):
     return not (self == other)
@@ -204,5 +485,69 @@ class Object(object):
 
       If the object is fully interpolated, it should be typechecked prior to
       return.
+
+      Since Objects are immutable, the result is computed once, along with that
+      of render(), and memoized on this instance.
+    """
+    interpolated, unbound, _ = self.render()
+    if interpolated is None:
+      # render() reports the failure as a TypeCheck; interpolate() raises it.
+      return self._interpolate()
+    return interpolated, unbound
+
+  def _interpolate(self):
+    """
+      Compute the result of interpolate() for this object, raising any error that
+      prevents it.
+    """
+    raise NotImplementedError
+
+  def ainterpolate(self, *providers):
+    """
+      Return a coroutine interpolating this object with its unbound Refs fetched
+      from providers (pystachio.aio.AsyncNamables.)  See pystachio.aio.
+    """
+    if not Compatibility.ASYNC:
+      raise RuntimeError('ainterpolate requires Python 3.5 or later.')
+    from pystachio.aio import ainterpolate
+    return ainterpolate(self, *providers)
+
+  def free_refs(self):
+    """
+      Return a dictionary mapping each Ref this object needs bound in order to be
+      fully interpolated (i.e. that interpolate() would report unbound) to the
+      paths of the fields that use it, e.g.
+
+        {Ref('mesos.instance'): ['name', 'processes[0].cmdline']}
+
+      The analysis works from the parsed templates of this object's values and
+      their scopes without rendering them, and is memoized on this instance.
+    """
+    if self._free is None:
+      self._free = tuple((ref, tuple(paths)) for ref, paths in self._free_refs().items())
+    return dict((ref, list(paths)) for ref, paths in self._free)
+
+  def _free_refs(self):
+    """
+      Compute the result of free_refs() for this object.
     """
     raise NotImplementedError
+
+  def _template_refs(self):
+    """
+      Return the Refs left unbound when this object is rendered as a string in its
+      own scopes (regardless of its modulo), or None if they can only be found by
+      rendering it.
+    """
+    return None
+
+  @staticmethod
+  def _merge_free_refs(free, segment, child):
+    """
+      Add the free refs of child, found at path segment (e.g. 'name' or '[0]'),
+      to free.
+    """
+    for ref, paths in child.free_refs().items():
+      free.setdefault(ref, []).extend(
+          segment + (path if not path or path.startswith('[') else '.' + path)
+          for path in paths)
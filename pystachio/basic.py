@@ -1,8 +1,7 @@
-import copy
-
 from pystachio.base import Object
 from pystachio.compatibility import Compatibility
 from pystachio.parsing import MustacheParser
+from pystachio.streaming import encode_scalar
 from pystachio.typing import Type, TypeFactory, TypeCheck
 
 
@@ -10,6 +9,8 @@ class SimpleObject(Object, Type):
   """
     A simply-valued (unnamable) object.
   """
+  __slots__ = ('_value',)
+
   def __init__(self, value):
     self._value = value
     Object.__init__(self)
@@ -18,11 +19,13 @@ class SimpleObject(Object, Type):
     return self._value
 
   def copy(self):
-    new_self = self.__class__(self._value)
-    new_self._scopes = copy.copy(self.scopes())
-    new_self._modulo = copy.copy(self.modulo())
+    new_self = self._view()
+    new_self._value = self._value
     return new_self
 
+  def _pickle_args(self):
+    return (self._value,)
+
   def _my_cmp(self, other):
     if self.__class__ != other.__class__:
       return -1
@@ -64,17 +67,33 @@ class SimpleObject(Object, Type):
   def __repr__(self):
     return '%s(%s)' % (self.__class__.__name__, str(self) if Compatibility.PY3 else unicode(self))
 
-  def interpolate(self):
+  def _interpolate(self):
     if not isinstance(self._value, Compatibility.stringy):
       return self.__class__(self.coerce(self._value)), []
     else:
-      joins, unbound = MustacheParser.resolve(self._value, *self.scopes())
+      joins, unbound = MustacheParser.resolve(self._value, *self.scope_chain().scopes())
       if unbound:
         return self.__class__(joins), [ref for ref in unbound if not self.modulo().covers(ref)]
       else:
-        self_copy = self.copy()
-        self_copy._value = self_copy.coerce(joins)
-        return self_copy, unbound
+        # Fully interpolated values need no scopes, so none are kept alive by them.
+        return self.__class__(self.coerce(joins)), unbound
+
+  def _template_refs(self):
+    if not isinstance(self._value, Compatibility.stringy):
+      return []
+    chain = self.scope_chain()
+    return MustacheParser._free_refs(self._value, chain.scopes(), frozenset(), chain.memo())
+
+  def _free_refs(self):
+    if not isinstance(self._value, Compatibility.stringy):
+      return {}
+    refs = self._template_refs()
+    if refs is None:
+      _, refs = MustacheParser.resolve(self._value, *self.scope_chain().scopes())
+    return dict((ref, ['']) for ref in refs if not self.modulo().covers(ref))
+
+  def _json_encode(self, write):
+    write(encode_scalar(self._value))
 
   @classmethod
   def type_factory(cls):
@@ -86,6 +105,8 @@ class SimpleObject(Object, Type):
 
 
 class String(SimpleObject):
+  __slots__ = ()
+
   @classmethod
   def checker(cls, obj):
     assert isinstance(obj, String)
@@ -113,6 +134,8 @@ class StringFactory(TypeFactory):
 
 
 class Integer(SimpleObject):
+  __slots__ = ()
+
   @classmethod
   def checker(cls, obj):
     assert isinstance(obj, Integer)
@@ -140,6 +163,8 @@ class IntegerFactory(TypeFactory):
 
 
 class Float(SimpleObject):
+  __slots__ = ()
+
   @classmethod
   def checker(cls, obj):
     assert isinstance(obj, Float)
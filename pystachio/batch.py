@@ -0,0 +1,103 @@
+"""
+  Render many objects in parallel across a pool of worker processes.
+
+  Objects can be pickled, but each pickle carries the types of its objects (by
+  name, or by schema for types not defined at module level.)  Instead, the
+  schemas of the objects (and of any Objects in their scopes) are sent to each
+  worker once, when it starts, and objects travel in the compact encoding of
+  pystachio.binary, in chunks: about a third of the size of their pickles and
+  twice as fast to produce.
+"""
+
+import multiprocessing
+
+from pystachio.base import Environment, Object
+from pystachio.binary import SchemaTable
+from pystachio.naming import Ref
+
+_WORKER = {}
+
+
+def _render(obj, index):
+  """
+    Interpolate obj, reporting failures as Object.InterpolationError.
+  """
+  try:
+    return obj.interpolate()
+  except Exception as e:
+    raise Object.InterpolationError('Failed to render object %d: %s' % (index, e))
+
+
+def _initialize(schemas, environment):
+  types = SchemaTable.load(schemas)
+  _WORKER['types'] = types
+  _WORKER['environment'] = (None if environment is None
+                            else SchemaTable.decode_scope(environment, types))
+
+
+def _render_chunk(chunk):
+  types, environment = _WORKER['types'], _WORKER['environment']
+  table = SchemaTable()
+  results = []
+  for index, type_index, value in chunk:
+    obj = SchemaTable.decode(types, type_index, value)
+    if environment is not None:
+      obj = obj.bind(environment)
+    try:
+      interpolated, unbound = _render(obj, index)
+    except Object.InterpolationError as e:
+      results.append((False, str(e)))
+    else:
+      results.append((True, table.encode(interpolated)[1],
+                      tuple(ref.address() for ref in unbound)))
+  return results
+
+
+def render_many(objects, environment=None, workers=None, chunksize=None):
+  """
+    Interpolate each of objects bound to environment (a dict or Environment, if
+    given), returning a list of (interpolated object, unbound refs) 2-tuples in
+    the order of objects.
+
+    With more than one worker (by default, one per CPU), objects are rendered in
+    a process pool, chunksize at a time.  The scopes objects (and their children)
+    are bound to must be Environments or Objects.
+
+    Raises Object.InterpolationError if any object fails to interpolate.
+  """
+  objects = list(objects)
+  if isinstance(environment, dict):
+    environment = Environment(environment)
+  if workers is None:
+    workers = multiprocessing.cpu_count()
+  workers = min(workers, len(objects))
+
+  if workers <= 1:
+    if environment is not None:
+      objects = [obj.bind(environment) for obj in objects]
+    return [_render(obj, index) for index, obj in enumerate(objects)]
+
+  table = SchemaTable()
+  tasks = []
+  for index, obj in enumerate(objects):
+    tasks.append((index,) + table.encode(obj, scopes=True))
+  encoded_environment = None if environment is None else table.encode_scope(environment)
+  if chunksize is None:
+    chunksize = max(1, len(tasks) // (workers * 4))
+  chunks = [tasks[k:k + chunksize] for k in range(0, len(tasks), chunksize)]
+
+  pool = multiprocessing.Pool(workers, _initialize, (table.schemas, encoded_environment))
+  try:
+    rendered = pool.map(_render_chunk, chunks, 1)
+  finally:
+    pool.close()
+    pool.join()
+
+  results = []
+  for (_, type_index, _), result in zip(tasks,
+      (result for chunk in rendered for result in chunk)):
+    if not result[0]:
+      raise Object.InterpolationError(result[1])
+    interpolated = SchemaTable.decode(table.types, type_index, result[1])
+    results.append((interpolated, [Ref.from_address(address) for address in result[2]]))
+  return results
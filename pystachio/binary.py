@@ -0,0 +1,293 @@
+"""
+  A compact, versioned binary format for pystachio objects.
+
+  A message holds a table of the type schemas it uses, each encoded once, and
+  values encoded positionally: Struct fields by index (in sorted field name
+  order, so independent of the order in which a class declares them), List
+  elements and Map entries as sequences, and simple values as-is.  The payload
+  is written with marshal, so only the standard library is needed.
+
+  marshal is not secure against erroneous or maliciously constructed data, so
+  only load messages from trusted sources.  Malformed messages raise DecodeError.
+
+    data = binary.dumps(task)
+    task = binary.loads(data)
+
+  As with json_dumps, objects are interpolated before they are encoded.
+"""
+
+import json
+import marshal
+import struct
+
+from pystachio.base import Environment, Object
+from pystachio.basic import SimpleObject
+from pystachio.cache import LRUCache
+from pystachio.composite import Empty, Structural
+from pystachio.container import ListContainer, MapContainer
+from pystachio.naming import Ref
+from pystachio.typing import TypeFactory
+
+MAGIC = b'PYST'
+VERSION = 1
+MARSHAL_VERSION = 2
+_HEADER = struct.Struct('>4sH')
+
+
+class DecodeError(ValueError):
+  pass
+
+
+class _Codec(object):
+  """
+    The encoder and decoder of values of a reified type, built once per class.
+
+    encode(obj, table) encodes obj's value, and with it the scopes of obj and its
+    children if table (the message's SchemaTable) is given.  decode(data, types)
+    is its inverse, given the types of the message's schema table.
+  """
+  @classmethod
+  def get(cls, klazz):
+    codec = klazz.__dict__.get('_BINARY_CODEC')
+    if codec is None:
+      codec = cls(klazz)
+      setattr(klazz, '_BINARY_CODEC', codec)
+    return codec
+
+  @staticmethod
+  def encode_value(obj, table):
+    # Values may be instances of a class equivalent to (but not the same as) the
+    # declared type, possibly with a different field order, so dispatch on their own.
+    data = _Codec.get(obj.__class__).encode(obj, table)
+    if table is not None and obj._scopes:
+      # Values are never dicts, so a dict marks a value with scopes.
+      data = {'value': data, 'scopes': tuple(table.encode_scope(scope) for scope in obj._scopes)}
+    return data
+
+  @staticmethod
+  def decode_value(codec, data, types):
+    if type(data) is dict:
+      obj = codec.decode(data['value'], types)
+      return obj.in_scope(*[SchemaTable.decode_scope(scope, types) for scope in data['scopes']])
+    return codec.decode(data, types)
+
+  def __init__(self, klazz):
+    if issubclass(klazz, Structural):
+      self.encode, self.decode = self._struct_codec(klazz)
+    elif issubclass(klazz, ListContainer):
+      self.encode, self.decode = self._list_codec(klazz)
+    elif issubclass(klazz, MapContainer):
+      self.encode, self.decode = self._map_codec(klazz)
+    elif issubclass(klazz, SimpleObject):
+      self.encode, self.decode = self._simple_codec(klazz)
+    else:
+      raise TypeError('Cannot encode values of type %s' % klazz.__name__)
+
+  @staticmethod
+  def _struct_codec(klazz):
+    order = tuple(sorted(range(len(klazz.FIELDS)), key=klazz.FIELDS.__getitem__))
+    codecs = [_Codec.get(klazz.FIELD_TYPES[index]) for index in order]
+    width = len(order)
+    encode_value, decode_value = _Codec.encode_value, _Codec.decode_value
+
+    def encode(obj, table):
+      values = obj._values
+      return tuple([None if values[index] is Empty else encode_value(values[index], table)
+                    for index in order])
+
+    def decode(data, types):
+      if len(data) != width:
+        raise DecodeError('Expected %d fields for %s, got %d' % (width, klazz.__name__, len(data)))
+      values = list(klazz.DEFAULTS)
+      for index, codec, value in zip(order, codecs, data):
+        values[index] = Empty if value is None else decode_value(codec, value, types)
+      return klazz._from_values(tuple(values))
+
+    return encode, decode
+
+  @staticmethod
+  def _list_codec(klazz):
+    codec = _Codec.get(klazz.TYPE)
+    encode_value, decode_value = _Codec.encode_value, _Codec.decode_value
+
+    def encode(obj, table):
+      return tuple([encode_value(value, table) for value in obj._values])
+
+    def decode(data, types):
+      return klazz([decode_value(codec, value, types) for value in data])
+
+    return encode, decode
+
+  @staticmethod
+  def _map_codec(klazz):
+    key_codec, value_codec = _Codec.get(klazz.KEYTYPE), _Codec.get(klazz.VALUETYPE)
+    encode_value, decode_value = _Codec.encode_value, _Codec.decode_value
+
+    def encode(obj, table):
+      return tuple([(encode_value(key, table), encode_value(value, table))
+                    for key, value in obj._map])
+
+    def decode(data, types):
+      return klazz(*[(decode_value(key_codec, key, types), decode_value(value_codec, value, types))
+                     for key, value in data])
+
+    return encode, decode
+
+  @staticmethod
+  def _simple_codec(klazz):
+    def encode(obj, table):
+      return obj._value
+
+    def decode(data, types):
+      return klazz(data)
+
+    return encode, decode
+
+
+SCHEMA_CACHE_SIZE = 1024
+_SCHEMAS = LRUCache(SCHEMA_CACHE_SIZE, name='binary.schemas')
+
+
+def _load_schema(schema):
+  """
+    Reify an encoded schema, caching the class so that repeated messages do not
+    re-reify their types.
+  """
+  return TypeFactory.new({}, *TypeFactory.type_tuple(json.loads(schema)))
+
+
+class SchemaTable(object):
+  """
+    The table of schemas in a message, to which values refer by index.
+  """
+
+  def __init__(self):
+    self.schemas = []
+    self.types = []
+    self._indices = {}
+
+  def index(self, klazz):
+    """
+      Return the index of klazz's schema, adding it to the table if necessary.
+    """
+    index = self._indices.get(klazz)
+    if index is None:
+      index = self._indices[klazz] = len(self.schemas)
+      self.schemas.append(json.dumps(klazz.serialize_type()))
+      self.types.append(klazz)
+    return index
+
+  def encode(self, obj, scopes=False):
+    """
+      Encode obj as it is, i.e. without interpolating it, returning a 2-tuple of
+      the index of its schema and its encoded value.  If scopes, the scopes of obj
+      and its children (Environments and Objects) are encoded too.
+    """
+    return self.index(obj.__class__), _Codec.encode_value(obj, self if scopes else None)
+
+  def encode_scope(self, scope):
+    """
+      Encode a scope.  Objects in scopes are encoded with their own scopes.
+    """
+    if isinstance(scope, Object):
+      return ('object',) + self.encode(scope, scopes=True)
+    elif isinstance(scope, Environment):
+      entries = []
+      for key, value in scope._table.items():
+        if isinstance(value, Object):
+          entries.append((key.address(), True) + self.encode(value, scopes=True))
+        else:
+          entries.append((key.address(), False, value))
+      return ('environment', tuple(entries))
+    raise TypeError('Cannot encode scopes of type %s' % type(scope).__name__)
+
+  @staticmethod
+  def decode_scope(data, types):
+    if data[0] == 'object':
+      return SchemaTable.decode(types, data[1], data[2])
+    environment = Environment()
+    for entry in data[1]:
+      address, is_object, value = entry[0], entry[1], entry[2:]
+      value = SchemaTable.decode(types, *value) if is_object else value[0]
+      environment._mount(Ref.from_address(address), value)
+    return environment
+
+  @staticmethod
+  def load(schemas):
+    """
+      Return the tuple of types for a sequence of encoded schemas.
+    """
+    return tuple(_SCHEMAS.get(schema, _load_schema) for schema in schemas)
+
+  @staticmethod
+  def decode(types, type_index, value):
+    try:
+      return _Codec.decode_value(_Codec.get(types[type_index]), value, types)
+    except DecodeError:
+      raise
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+      raise DecodeError('Malformed value: %s' % e)
+
+
+def _pack(schemas, values):
+  return _HEADER.pack(MAGIC, VERSION) + marshal.dumps((tuple(schemas), tuple(values)),
+      MARSHAL_VERSION)
+
+
+def _unpack(data):
+  if len(data) < _HEADER.size:
+    raise DecodeError('Truncated header')
+  magic, version = _HEADER.unpack_from(data)
+  if magic != MAGIC:
+    raise DecodeError('Not a pystachio binary message')
+  if version != VERSION:
+    raise DecodeError('Unsupported binary format version %d' % version)
+  try:
+    schemas, values = marshal.loads(data[_HEADER.size:])
+    return SchemaTable.load(schemas), tuple(values)
+  except DecodeError:
+    raise
+  # marshal raises a variety of errors on malformed input.
+  except Exception as e:
+    raise DecodeError('Malformed message: %s' % e)
+
+
+def dumps_many(objects):
+  """
+    Encode a sequence of objects, possibly of different types, into one message.
+    Each distinct type's schema is only encoded once.
+  """
+  table = SchemaTable()
+  values = [table.encode(obj.interpolate()[0]) for obj in objects]
+  return _pack(table.schemas, values)
+
+
+def loads_many(data):
+  """
+    Decode a message produced by dumps_many, returning a list of objects.  Raises
+    DecodeError if data is malformed.  Only decode data from trusted sources: see
+    the module documentation.
+  """
+  types, values = _unpack(data)
+  try:
+    return [SchemaTable.decode(types, type_index, value) for type_index, value in values]
+  except DecodeError:
+    raise
+  except (TypeError, ValueError) as e:
+    raise DecodeError('Malformed message: %s' % e)
+
+
+def dumps(obj):
+  return dumps_many([obj])
+
+
+def loads(data):
+  """
+    Decode a message produced by dumps.  Raises DecodeError if data is not a
+    message holding exactly one object.  Only decode data from trusted sources:
+    see the module documentation.
+  """
+  objects = loads_many(data)
+  if len(objects) != 1:
+    raise DecodeError('Expected a single object, got %d' % len(objects))
+  return objects[0]
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+import threading
+import weakref
+
+
+class LRUCache(object):
+  """
+    A bounded, thread-safe least-recently-used mapping.
+
+    Values are computed on demand via get(key, compute) and the least recently
+    used entry is evicted once more than `capacity` entries are held.  Hit and
+    miss counters are kept for introspection via stats().  Caches given a name
+    are listed by LRUCache.named().
+  """
+  _NAMED = weakref.WeakValueDictionary()
+
+  def __init__(self, capacity, name=None):
+    if name is not None:
+      LRUCache._NAMED[name] = self
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+    self._capacity = 0
+    self.resize(capacity)
+    self.hits = 0
+    self.misses = 0
+
+  def resize(self, capacity):
+    """
+      Set the maximum number of cached entries.  A capacity of 0 disables caching.
+    """
+    if capacity < 0:
+      raise ValueError('LRUCache capacity must be non-negative, got %s' % capacity)
+    with self._lock:
+      self._capacity = capacity
+      while len(self._entries) > self._capacity:
+        self._entries.popitem(last=False)
+
+  @property
+  def capacity(self):
+    return self._capacity
+
+  def get(self, key, compute):
+    """
+      Return the value cached for key, calling compute(key) to produce it on a
+      miss.  Exceptions raised by compute propagate and nothing is cached.
+    """
+    with self._lock:
+      try:
+        value = self._entries.pop(key)
+      except KeyError:
+        self.misses += 1
+      else:
+        self.hits += 1
+        self._entries[key] = value
+        return value
+    value = compute(key)
+    with self._lock:
+      if self._capacity:
+        self._entries[key] = value
+        while len(self._entries) > self._capacity:
+          self._entries.popitem(last=False)
+    return value
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self.hits = 0
+      self.misses = 0
+
+  def reset_stats(self):
+    """
+      Zero the hit and miss counters, keeping the cached entries.
+    """
+    with self._lock:
+      self.hits = 0
+      self.misses = 0
+
+  def stats(self):
+    with self._lock:
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'size': len(self._entries),
+        'capacity': self._capacity,
+      }
+
+  @staticmethod
+  def named():
+    """
+      Return a dictionary of the live caches that were given a name.
+    """
+    return dict(LRUCache._NAMED.items())
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __contains__(self, key):
+    return key in self._entries
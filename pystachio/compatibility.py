@@ -11,3 +11,5 @@ class Compatibility(object):
   numeric = integer + real
   PY2 = version_info[0] == 2
   PY3 = version_info[0] == 3
+  # async def (and so pystachio.aio) is a SyntaxError before 3.5.
+  ASYNC = version_info >= (3, 5)
@@ -1,10 +1,11 @@
 from collections import Mapping
-import copy
 from inspect import isclass
 import json
 
 from pystachio.base import Object, Environment
 from pystachio.naming import Ref, Namable, frozendict
+from pystachio.streaming import dump, dumps, encode_key, iter_json_values
+from pystachio.tracing import ResolutionTracer
 from pystachio.typing import (
   Type,
   TypeCheck,
@@ -122,10 +123,13 @@ def Provided(*types, **bound_types):
 
     old_type_environment = TypeEnvironment.deserialize(klazz_bindings, {})
     new_type_environment = TypeEnvironment(*types, **bound_types)
-    return TypeFactory.new({}, 'Struct',
+    provided = TypeFactory.new({}, 'Struct',
       klazz_name,
       new_type_environment.merge(old_type_environment).serialize(),
       klazz_attributes)
+    if provided.__module__ == TypeMetaclass.__module__:
+      provided.__module__ = klazz.__module__
+    return provided
   return annotator
 
 
@@ -149,12 +153,18 @@ class StructFactory(TypeFactory):
     name, bindings, parameters = type_parameters
     for param in parameters:
       assert isinstance(param, tuple)
-    typemap = dict((attr, TypeSignature.deserialize(param, type_dict))
-                   for attr, param in parameters)
     bindings = TypeEnvironment.deserialize(bindings, type_dict)
-    attributes = {'TYPEMAP': typemap, 'REQUIRES': bindings}
+    attributes = Structural.layout((attr, TypeSignature.deserialize(param, type_dict))
+                                   for attr, param in parameters)
+    attributes.update(REQUIRES=bindings)
     return TypeMetaclass(str(name), (Structural,), attributes)
 
+  @staticmethod
+  def dependencies(*type_parameters):
+    name, bindings, parameters = type_parameters
+    return (tuple(binding[0] for binding in bindings) +
+            tuple(param[3] for _, param in parameters))
+
 
 class StructMetaclass(type):
   """
@@ -172,7 +182,12 @@ class StructMetaclass(type):
   def __new__(mcs, name, parents, attributes):
     if any(parent.__name__ == 'Struct' for parent in parents):
       type_parameters = StructMetaclass.attributes_to_parameters(attributes)
-      return TypeFactory.new({}, 'Struct', name, (), type_parameters)
+      klazz = TypeFactory.new({}, 'Struct', name, (), type_parameters)
+      # Attribute the class to the module declaring it (rather than to the module
+      # that reified it), unless it is a canonical type already claimed by one.
+      if '__module__' in attributes and klazz.__module__ == TypeMetaclass.__module__:
+        klazz.__module__ = attributes['__module__']
+      return klazz
     else:
       return type.__new__(mcs, name, parents, attributes)
 
@@ -180,64 +195,144 @@ class StructMetaclass(type):
 StructMetaclassWrapper = StructMetaclass('StructMetaclassWrapper', (object,), {})
 
 class Structural(Object, Type, Namable):
-  """A Structural base type for composite objects."""
+  """
+    A Structural base type for composite objects.
+
+    Each reified Struct class carries a fixed field layout derived from its
+    TYPEMAP (see Structural.layout) and its instances store their values in a
+    tuple indexed by that layout rather than in a per-instance dictionary.
+  """
+  __slots__ = ('_values', '_self_environment', '_scope_chain')
+
+  @staticmethod
+  def layout(signatures):
+    """
+      Compute the class attributes describing the field layout for a sequence of
+      (attribute name, TypeSignature) pairs, in a single pass:
+
+        TYPEMAP: attribute name => TypeSignature
+        FIELDS: attribute names, in field index order
+        FIELD_INDEX: attribute name => field index
+        FIELD_TYPES: the class of each field
+        DEFAULTS: the default value (or Empty) of each field
+        REQUIRED_FIELDS: the indices of required fields
+    """
+    typemap, field_index = {}, {}
+    fields, field_types, defaults, required_fields = [], [], [], []
+    for index, (name, signature) in enumerate(signatures):
+      typemap[name] = signature
+      field_index[name] = index
+      fields.append(name)
+      field_types.append(signature.klazz)
+      defaults.append(signature.default)
+      if signature.required:
+        required_fields.append(index)
+    return {
+      'TYPEMAP': typemap,
+      'FIELDS': tuple(fields),
+      'FIELD_INDEX': field_index,
+      'FIELD_TYPES': tuple(field_types),
+      'DEFAULTS': tuple(defaults),
+      'REQUIRED_FIELDS': tuple(required_fields),
+      '__slots__': (),
+    }
+
+  @classmethod
+  def _json_keys(cls):
+    """
+      The JSON-encoded key of each field, computed on first use and cached on the
+      class.
+    """
+    json_keys = cls.__dict__.get('_JSON_KEYS')
+    if json_keys is None:
+      json_keys = tuple(encode_key(name) + ': ' for name in cls.FIELDS)
+      setattr(cls, '_JSON_KEYS', json_keys)
+    return json_keys
 
   def __init__(self, *args, **kw):
-    self._init_schema_data()
+    self._self_environment = None
+    self._scope_chain = None
+    self._values = self.DEFAULTS
     for arg in args:
       if not isinstance(arg, Mapping):
         raise ValueError('Expected dictionary argument, got %s' % repr(arg))
       self._update_schema_data(**arg)
-    self._update_schema_data(**copy.copy(kw))
+    self._update_schema_data(**kw)
     Object.__init__(self)
 
-  def get(self):
-    return frozendict((k, v.get()) for k, v in self._schema_data.items() if v is not Empty)
+  @classmethod
+  def _from_values(cls, values):
+    """
+      Construct an instance directly from a tuple of already-coerced field values.
+    """
+    new_self = cls.__new__(cls)
+    new_self._self_environment = None
+    new_self._scope_chain = None
+    new_self._values = values
+    Object.__init__(new_self)
+    return new_self
+
+  @property
+  def _schema_data(self):
+    return frozendict(zip(self.FIELDS, self._values))
 
-  def _init_schema_data(self):
-    self._schema_data = {}
-    for attr in self.TYPEMAP:
-      self._schema_data[attr] = self.TYPEMAP[attr].default
-    self._schema_data = frozendict(self._schema_data)
+  def _items(self):
+    return zip(self.FIELDS, self._values)
+
+  def get(self):
+    return frozendict((k, v.get()) for k, v in self._items() if v is not Empty)
 
   def _process_schema_attribute(self, attr, value):
-    if attr not in self.TYPEMAP:
+    if attr not in self.FIELD_INDEX:
       raise AttributeError('Unknown schema attribute %s' % attr)
-    schema_type = self.TYPEMAP[attr]
+    klazz = self.FIELD_TYPES[self.FIELD_INDEX[attr]]
     if value is Empty:
       return Empty
-    elif isinstance(value, schema_type.klazz):
+    elif isinstance(value, klazz):
       return value
     else:
-      return schema_type.klazz(value)
+      return klazz(value)
 
   def _update_schema_data(self, **kw):
+    if not kw:
+      return
+    values = list(self._values)
     for attr, value in kw.items():
-      self._schema_data[attr] = self._process_schema_attribute(attr, value)
+      coerced = self._process_schema_attribute(attr, value)
+      values[self.FIELD_INDEX[attr]] = coerced
+    self._values = tuple(values)
+    self._self_environment = None
+    self._scope_chain = None
 
   def copy(self):
-    new_object = self.__class__(**self._schema_data)
-    new_object._scopes = copy.copy(self.scopes())
-    new_object._modulo = copy.copy(self.modulo())
-    return new_object
+    new_self = self._view()
+    new_self._values = self._values
+    new_self._self_environment = self._self_environment
+    new_self._scope_chain = None
+    return new_self
+
+  def _pickle_args(self):
+    return (dict((key, value) for key, value in self._items() if value is not Empty),)
 
   def __call__(self, **kw):
     new_self = self.copy()
-    new_self._update_schema_data(**copy.copy(kw))
+    new_self._update_schema_data(**kw)
     return new_self
 
   def __eq__(self, other):
     if not isinstance(other, Structural): return False
     if self.TYPEMAP != other.TYPEMAP: return False
-    si = self.interpolate()
-    oi = other.interpolate()
-    return si[0]._schema_data == oi[0]._schema_data
+    si, _ = self.interpolate()
+    oi, _ = other.interpolate()
+    if self.FIELDS == other.FIELDS:
+      return si._values == oi._values
+    return si._schema_data == oi._schema_data
 
   def __repr__(self):
     si, _ = self.interpolate()
     return '%s(%s)' % (
       self.__class__.__name__,
-      ', '.join('%s=%s' % (key, val) for key, val in si._schema_data.items() if val is not Empty)
+      ', '.join('%s=%s' % (key, val) for key, val in si._items() if val is not Empty)
     )
 
   def __getattr__(self, attr):
@@ -245,61 +340,83 @@ class Structural(Object, Type, Namable):
       raise AttributeError
 
     if attr.startswith('has_'):
-      if attr[4:] in self.TYPEMAP:
-        return lambda: self._schema_data[attr[4:]] != Empty
+      if attr[4:] in self.FIELD_INDEX:
+        index = self.FIELD_INDEX[attr[4:]]
+        return lambda: self._values[index] is not Empty
 
-    if attr not in self.TYPEMAP:
+    if attr not in self.FIELD_INDEX:
       raise AttributeError("%s has no attribute %s" % (self.__class__.__name__, attr))
 
     return lambda: self.interpolate_key(attr)
 
-  def check(self):
-    for name, signature in self.TYPEMAP.items():
-      if self._schema_data[name] is Empty and signature.required:
-        return TypeCheck.failure('%s[%s] is required.' % (self.__class__.__name__, name))
-      elif self._schema_data[name] is not Empty:
-        type_check = (self._schema_data[name].in_scope(*self.scopes())
-                                             .provided(self.modulo())
-                                             .check())
-        if type_check.ok():
-          continue
-        else:
-          return TypeCheck.failure('%s[%s] failed: %s' % (self.__class__.__name__, name,
-            type_check.message()))
-    return TypeCheck.success()
+  def _render(self):
+    return self._walk(True)
+
+  def _interpolate(self):
+    return self._walk(False)[:2]
+
+  def _walk(self, check):
+    """
+      Interpolate the fields of this object, returning the 3-tuple of render().
+      If check, fields are also type checked, and the first failing field in field
+      order is reported, whether it is a missing required field or a child that
+      fails its own check; otherwise errors interpolating fields are raised.
+    """
+    typecheck = None
+    unbound = set()
+    interpolated = []
+    scopes = self.scope_chain()
+    modulo = self.modulo()
+    tracer = ResolutionTracer.current()
+    for name, value in self._items():
+      if value is Empty:
+        if check and typecheck is None and self.TYPEMAP[name].required:
+          typecheck = TypeCheck.failure('%s[%s] is required.' % (self.__class__.__name__, name))
+        interpolated.append(Empty)
+        continue
+      value = value._scoped(scopes, modulo)
+      vinterp, vunbound, vcheck = (value._visit(check) if tracer is None
+                                   else tracer.within(name, value._visit, check))
+      if check:
+        if typecheck is None and not vcheck.ok():
+          typecheck = TypeCheck.failure('%s[%s] failed: %s' % (self.__class__.__name__, name,
+            vcheck.message()))
+        if vinterp is None:
+          return None, [], typecheck
+      unbound.update(vunbound)
+      interpolated.append(vinterp)
+    return (self._from_values(tuple(interpolated)), list(unbound),
+            typecheck or TypeCheck.success())
 
   def modulo(self):
     return super(Structural, self).modulo().merge(self.REQUIRES)
 
   def _self_scope(self):
-    return dict((key, value) for (key, value) in self._schema_data.items()
-                if value is not Empty)
-
-  def scopes(self):
-    return [Environment(self._self_scope())] + self._scopes
-
-  def interpolate(self):
-    unbound = set()
-    interpolated_schema_data = {}
-    scopes = self.scopes()
+    return dict((key, value) for (key, value) in self._items() if value is not Empty)
+
+  def scope_chain(self):
+    # The self scope depends only on the (immutable) schema data, so it is built
+    # once and shared by views; the chain is cached until the scopes change.
+    if self._scope_chain is None:
+      if self._self_environment is None:
+        self._self_environment = Environment(self._self_scope())
+      self._scope_chain = self._scopes.prepend((self._self_environment,))
+    return self._scope_chain
+
+  def _free_refs(self):
+    free = {}
+    scopes = self.scope_chain()
     modulo = self.modulo()
-    for key, value in self._schema_data.items():
-      if value is Empty:
-        interpolated_schema_data[key] = Empty
-      else:
-        vinterp, vunbound = value.in_scope(*scopes).provided(modulo).interpolate()
-        unbound.update(vunbound)
-        interpolated_schema_data[key] = vinterp
-    return self.__class__(**interpolated_schema_data), list(unbound)
+    for name, value in self._items():
+      if value is not Empty:
+        Object._merge_free_refs(free, name, value._scoped(scopes, modulo))
+    return free
 
   def interpolate_key(self, attribute):
-    if self._schema_data[attribute] is Empty:
+    value = self._values[self.FIELD_INDEX[attribute]]
+    if value is Empty:
       return Empty
-    vinterp, _ = (
-      self._schema_data[attribute].in_scope(*self.scopes())
-                                  .provided(self.modulo())
-                                  .interpolate())
-    return self._process_schema_attribute(attribute, vinterp)
+    return self._dereference(value)
 
   @classmethod
   def type_factory(cls):
@@ -331,38 +448,57 @@ class Structural(Object, Type, Namable):
     return dict((key, val) for (key, val) in values.items()
                 if key in cls.TYPEMAP)
 
+  @classmethod
+  def _from_json(cls, value, strict=False):
+    return cls(value if strict else cls._filter_against_schema(value))
+
   @classmethod
   def json_load(cls, fp, strict=False):
-    return cls(json.load(fp) if strict else cls._filter_against_schema(json.load(fp)))
+    return cls._from_json(json.load(fp), strict=strict)
 
   @classmethod
   def json_loads(cls, json_string, strict=False):
-    return cls(json.loads(json_string) if strict
-               else cls._filter_against_schema(json.loads(json_string)))
+    return cls._from_json(json.loads(json_string), strict=strict)
+
+  @classmethod
+  def json_iter(cls, fp, strict=False):
+    """
+      Incrementally load instances of this Struct from fp, which holds either a
+      JSON array of objects or JSON Lines, yielding them one at a time.
+    """
+    for value in iter_json_values(fp):
+      yield cls._from_json(value, strict=strict)
+
+  def _json_encode(self, write):
+    separator = '{'
+    for key, value in zip(self._json_keys(), self._values):
+      if value is not Empty:
+        write(separator + key)
+        value._json_encode(write)
+        separator = ', '
+    write('}' if separator == ', ' else '{}')
 
   def json_dump(self, fp):
-    d, _ = self.interpolate()
-    return json.dump(d.get(), fp)
+    return dump(self, fp)
 
   def json_dumps(self):
-    d, _ = self.interpolate()
-    return json.dumps(d.get())
+    return dumps(self)
 
   def find(self, ref):
     if not ref.is_dereference():
       raise Namable.NamingError(self, ref)
     name = ref.action().value
-    if name not in self.TYPEMAP or self._schema_data[name] is Empty:
+    if name not in self.FIELD_INDEX or self._values[self.FIELD_INDEX[name]] is Empty:
       raise Namable.NotFound(self, ref)
     else:
-      namable = self._schema_data[name]
+      namable = self._values[self.FIELD_INDEX[name]]
       if ref.rest().is_empty():
-        return namable.in_scope(*self.scopes())
+        return namable._scoped(self.scope_chain())
       else:
         if not isinstance(namable, Namable):
           raise Namable.Unnamable(namable)
         else:
-          return namable.in_scope(*self.scopes()).find(ref.rest())
+          return namable._scoped(self.scope_chain()).find(ref.rest())
 
 
 class Struct(StructMetaclassWrapper, Structural):
@@ -1,10 +1,12 @@
-from collections import Iterable, Mapping, Sequence
+from collections import Iterable, Mapping, OrderedDict, Sequence
 import copy
 from inspect import isclass
 
 from pystachio.base import Object
 from pystachio.compatibility import Compatibility
 from pystachio.naming import Namable, Ref, frozendict
+from pystachio.streaming import encode_key, iter_json_values
+from pystachio.tracing import ResolutionTracer
 from pystachio.typing import (
   Type,
   TypeCheck,
@@ -24,7 +26,12 @@ class ListFactory(TypeFactory):
     klazz = TypeFactory.new(type_dict, *type_parameters[0])
     assert isclass(klazz)
     assert issubclass(klazz, Object)
-    return TypeMetaclass('%sList' % klazz.__name__, (ListContainer,), { 'TYPE': klazz })
+    return TypeMetaclass('%sList' % klazz.__name__, (ListContainer,),
+      { 'TYPE': klazz, '__slots__': () })
+
+  @staticmethod
+  def dependencies(*type_parameters):
+    return type_parameters
 
 
 class ListContainer(Namable, Object, Type):
@@ -34,6 +41,8 @@ class ListContainer(Namable, Object, Type):
     set to the contained type.  If you want a concrete List type, see the
     List() function.
   """
+  __slots__ = ('_values',)
+
   def __init__(self, vals):
     self._values = self._coerce_values(copy.copy(vals))
     Object.__init__(self)
@@ -42,11 +51,13 @@ class ListContainer(Namable, Object, Type):
     return tuple([v.get() for v in self._values])
 
   def copy(self):
-    new_self = self.__class__(self._values)
-    new_self._scopes = copy.copy(self.scopes())
-    new_self._modulo = copy.copy(self.modulo())
+    new_self = self._view()
+    new_self._values = self._values
     return new_self
 
+  def _pickle_args(self):
+    return (self._values,)
+
   def __hash__(self):
     return hash(self.get())
 
@@ -56,10 +67,16 @@ class ListContainer(Namable, Object, Type):
       ', '.join(str(v) if Compatibility.PY3 else unicode(v) for v in si._values))
 
   def __iter__(self):
+    if self._lazy:
+      return (self._dereference(value) for value in self._values)
     si, _ = self.interpolate()
     return iter(si._values)
 
   def __getitem__(self, index_or_slice):
+    if self._lazy:
+      if isinstance(index_or_slice, slice):
+        return tuple(self._dereference(value) for value in self._values[index_or_slice])
+      return self._dereference(self._values[index_or_slice])
     si, _ = self.interpolate()
     return si._values[index_or_slice]
 
@@ -88,24 +105,35 @@ class ListContainer(Namable, Object, Type):
       return value if isinstance(value, self.TYPE) else self.TYPE(value)
     return tuple([coerced(v) for v in values])
 
-  def check(self):
-    assert ListContainer.isiterable(self._values)
-    for element in self._values:
-      assert isinstance(element, self.TYPE)
-      typecheck = element.in_scope(*self.scopes()).provided(self.modulo()).check()
-      if not typecheck.ok():
-        return TypeCheck.failure("Element in %s failed check: %s" % (self.__class__.__name__,
-          typecheck.message()))
-    return TypeCheck.success()
-
-  def interpolate(self):
+  def _render(self):
+    return self._walk(True)
+
+  def _interpolate(self):
+    return self._walk(False)[:2]
+
+  def _walk(self, check):
+    """
+      Interpolate the elements of this list, returning the 3-tuple of render().
+      If check, elements are also type checked; otherwise errors interpolating
+      them are raised.
+    """
+    typecheck = None
     unbound = set()
     interpolated = []
-    for element in self._values:
-      einterp, eunbound = element.in_scope(*self.scopes()).provided(self.modulo()).interpolate()
+    tracer = ResolutionTracer.current()
+    for index, element in enumerate(self._values):
+      element = element._scoped(self.scope_chain(), self.modulo())
+      einterp, eunbound, echeck = (element._visit(check) if tracer is None
+                                   else tracer.within('[%d]' % index, element._visit, check))
+      if check:
+        if typecheck is None and not echeck.ok():
+          typecheck = TypeCheck.failure("Element in %s failed check: %s" % (
+            self.__class__.__name__, echeck.message()))
+        if einterp is None:
+          return None, [], typecheck
       interpolated.append(einterp)
       unbound.update(eunbound)
-    return self.__class__(interpolated), list(unbound)
+    return self.__class__(interpolated), list(unbound), typecheck or TypeCheck.success()
 
   @classmethod
   def provides(cls, ref):
@@ -130,12 +158,36 @@ class ListContainer(Namable, Object, Type):
     else:
       namable = self._values[intvalue]
       if ref.rest().is_empty():
-        return namable.in_scope(*self.scopes())
+        return namable._scoped(self.scope_chain())
       else:
         if not isinstance(namable, Namable):
           raise Namable.Unnamable(namable)
         else:
-          return namable.in_scope(*self.scopes()).find(ref.rest())
+          return namable._scoped(self.scope_chain()).find(ref.rest())
+
+  def _free_refs(self):
+    free = {}
+    for index, element in enumerate(self._values):
+      Object._merge_free_refs(free, '[%d]' % index,
+          element._scoped(self.scope_chain(), self.modulo()))
+    return free
+
+  def _json_encode(self, write):
+    write('[')
+    for index, value in enumerate(self._values):
+      if index:
+        write(', ')
+      value._json_encode(write)
+    write(']')
+
+  @classmethod
+  def json_iter(cls, fp, strict=False):
+    """
+      Incrementally load the elements of this List from fp, which holds either a
+      JSON array or JSON Lines, yielding them one at a time as cls.TYPE.
+    """
+    for value in iter_json_values(fp):
+      yield cls.TYPE._from_json(value, strict=strict)
 
   @classmethod
   def type_factory(cls):
@@ -160,7 +212,11 @@ class MapFactory(TypeFactory):
     assert isclass(key_klazz) and isclass(value_klazz)
     assert issubclass(key_klazz, Object) and issubclass(value_klazz, Object)
     return TypeMetaclass('%s%sMap' % (key_klazz.__name__, value_klazz.__name__), (MapContainer,),
-      { 'KEYTYPE': key_klazz, 'VALUETYPE': value_klazz })
+      { 'KEYTYPE': key_klazz, 'VALUETYPE': value_klazz, '__slots__': () })
+
+  @staticmethod
+  def dependencies(*type_parameters):
+    return type_parameters
 
 
 class MapContainer(Namable, Object, Type):
@@ -172,7 +228,12 @@ class MapContainer(Namable, Object, Type):
 
     __init__(dict) => translates to list of tuples & sanity checks
     __init__(tuple) => sanity checks
+
+    Lookups go through a lazily built dictionary from the (interpolated) value
+    of each key to its value, so they are O(1) after the first access.
   """
+  __slots__ = ('_map', '_index', '_scoped_index')
+
   def __init__(self, *args):
     """
       Construct a map.
@@ -186,6 +247,8 @@ class MapContainer(Namable, Object, Type):
       self._map = self._coerce_tuple(args)
     else:
       raise ValueError("Unexpected input to MapContainer: %s" % repr(args))
+    self._index = None
+    self._scoped_index = None
     Object.__init__(self)
 
   def get(self):
@@ -209,18 +272,45 @@ class MapContainer(Namable, Object, Type):
     si, _ = self.interpolate()
     return (t[0] for t in si._map)
 
+  @staticmethod
+  def _key_value(key):
+    """
+      The hashable value by which a key is indexed: its interpolated raw value.
+    """
+    return key.interpolate()[0].get()
+
+  def _lookup(self, key_value, scoped=False):
+    """
+      Return the value for the first entry whose key has the value key_value (see
+      _key_value), using the index of this map's keys (built on first use.)
+      Raises KeyError if absent.
+
+      If scoped, keys are interpolated in this map's scope rather than their own.
+    """
+    index = self._scoped_index if scoped else self._index
+    if index is None:
+      index = {}
+      for entry_key, entry_value in self._map:
+        if scoped:
+          entry_key = entry_key._scoped(self.scope_chain(), self.modulo())
+        index.setdefault(self._key_value(entry_key), entry_value)
+      if scoped:
+        self._scoped_index = index
+      else:
+        self._index = index
+    return index[key_value]
+
   def __getitem__(self, key):
-    if not isinstance(key, self.KEYTYPE):
-      try:
-        key = self.KEYTYPE(key)
-      except ValueError:
-        raise KeyError("%s is not coercable to %s" % self.KEYTYPE.__name__)
-    # TODO(wickman) The performance of this should be improved.
-    si, _ = self.interpolate()
-    for tup in si._map:
-      if key == tup[0]:
-        return tup[1]
-    raise KeyError("%s not found" % key)
+    try:
+      key_value = self._key_value(key if isinstance(key, self.KEYTYPE) else self.KEYTYPE(key))
+    except ValueError:
+      raise KeyError("%r is not coercable to %s" % (key, self.KEYTYPE.__name__))
+    si = self if self._lazy else self.interpolate()[0]
+    try:
+      value = si._lookup(key_value, scoped=self._lazy)
+    except KeyError:
+      raise KeyError("%s not found" % key)
+    return self._dereference(value) if self._lazy else value
 
   def __contains__(self, item):
     try:
@@ -230,11 +320,15 @@ class MapContainer(Namable, Object, Type):
       return False
 
   def copy(self):
-    new_self = self.__class__(*self._map)
-    new_self._scopes = copy.copy(self.scopes())
-    new_self._modulo = copy.copy(self.modulo())
+    new_self = self._view()
+    new_self._map = self._map
+    new_self._index = self._index
+    new_self._scoped_index = None
     return new_self
 
+  def _pickle_args(self):
+    return self._map
+
   def __repr__(self):
     si, _ = self.interpolate()
     return '%s(%s)' % (self.__class__.__name__,
@@ -248,31 +342,44 @@ class MapContainer(Namable, Object, Type):
     oi, _ = other.interpolate()
     return si._map == oi._map
 
-  def check(self):
-    assert isinstance(self._map, tuple)
-    for key, value in self._map:
-      assert isinstance(key, self.KEYTYPE)
-      assert isinstance(value, self.VALUETYPE)
-      keycheck = key.in_scope(*self.scopes()).provided(self.modulo()).check()
-      valuecheck = value.in_scope(*self.scopes()).provided(self.modulo()).check()
-      if not keycheck.ok():
-        return TypeCheck.failure("%s key %s failed check: %s" % (self.__class__.__name__,
-          key, keycheck.message()))
-      if not valuecheck.ok():
-        return TypeCheck.failure("%s[%s] value %s failed check: %s" % (self.__class__.__name__,
-          key, value, valuecheck.message()))
-    return TypeCheck.success()
-
-  def interpolate(self):
+  def _render(self):
+    return self._walk(True)
+
+  def _interpolate(self):
+    return self._walk(False)[:2]
+
+  def _walk(self, check):
+    """
+      Interpolate the keys and values of this map, returning the 3-tuple of
+      render().  If check, they are also type checked; otherwise errors
+      interpolating them are raised.
+    """
+    typecheck = None
     unbound = set()
     interpolated = []
+    tracer = ResolutionTracer.current()
     for key, value in self._map:
-      kinterp, kunbound = key.in_scope(*self.scopes()).provided(self.modulo()).interpolate()
-      vinterp, vunbound = value.in_scope(*self.scopes()).provided(self.modulo()).interpolate()
+      skey = key._scoped(self.scope_chain(), self.modulo())
+      svalue = value._scoped(self.scope_chain(), self.modulo())
+      kinterp, kunbound, keycheck = skey._visit(check)
+      if tracer is None:
+        vinterp, vunbound, valuecheck = svalue._visit(check)
+      else:
+        segment = '[%s]' % (key if kinterp is None else kinterp).get()
+        vinterp, vunbound, valuecheck = tracer.within(segment, svalue._visit, check)
+      if check:
+        if typecheck is None and not keycheck.ok():
+          typecheck = TypeCheck.failure("%s key %s failed check: %s" % (self.__class__.__name__,
+            key, keycheck.message()))
+        if typecheck is None and not valuecheck.ok():
+          typecheck = TypeCheck.failure("%s[%s] value %s failed check: %s" % (
+            self.__class__.__name__, key, value, valuecheck.message()))
+        if kinterp is None or vinterp is None:
+          return None, [], typecheck
       unbound.update(kunbound)
       unbound.update(vunbound)
       interpolated.append((kinterp, vinterp))
-    return self.__class__(*interpolated), list(unbound)
+    return self.__class__(*interpolated), list(unbound), typecheck or TypeCheck.success()
 
   @classmethod
   def provides(cls, ref):
@@ -289,17 +396,42 @@ class MapContainer(Namable, Object, Type):
   def find(self, ref):
     if not ref.is_index():
       raise Namable.NamingError(self, ref)
-    kvalue = self.KEYTYPE(ref.action().value)
-    for key, namable in self._map:
-      if kvalue == key:
-        if ref.rest().is_empty():
-          return namable.in_scope(*self.scopes())
-        else:
-          if not isinstance(namable, Namable):
-            raise Namable.Unnamable(namable)
-          else:
-            return namable.in_scope(*self.scopes()).find(ref.rest())
-    raise Namable.NotFound(self, ref)
+    try:
+      namable = self._lookup(self._key_value(self.KEYTYPE(ref.action().value)))
+    except KeyError:
+      raise Namable.NotFound(self, ref)
+    if ref.rest().is_empty():
+      return namable._scoped(self.scope_chain())
+    else:
+      if not isinstance(namable, Namable):
+        raise Namable.Unnamable(namable)
+      else:
+        return namable._scoped(self.scope_chain()).find(ref.rest())
+
+  def _free_refs(self):
+    free = {}
+    for key, value in self._map:
+      skey = key._scoped(self.scope_chain(), self.modulo())
+      try:
+        segment = '[%s]' % self._key_value(skey)
+      except Object.CoercionError:
+        segment = '[%s]' % key.get()
+      Object._merge_free_refs(free, segment, skey)
+      Object._merge_free_refs(free, segment, value._scoped(self.scope_chain(), self.modulo()))
+    return free
+
+  def _json_encode(self, write):
+    # As with get(), the last of any duplicate keys wins.
+    entries = OrderedDict()
+    for key, value in self._map:
+      entries[key.get()] = value
+    write('{')
+    for index, (key, value) in enumerate(entries.items()):
+      if index:
+        write(', ')
+      write(encode_key(key) + ': ')
+      value._json_encode(write)
+    write('}')
 
   @classmethod
   def type_factory(cls):
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import os
+import threading
+from timeit import default_timer
+
+from pystachio.cache import LRUCache
+
+
+class Instrumentation(object):
+  """
+    Opt-in, process-wide counters and timers for the interpolation engine.
+
+    Enable with Instrumentation.enable(), within an Instrumentation.instrumented()
+    block, or by setting PYSTACHIO_INSTRUMENT=1 in the environment.  While
+    disabled, instrumented call sites only test Instrumentation._ENABLED.
+
+    Counters:
+      copy: Objects copied (copy, bind, in_scope, ...)
+      interpolate.<Type>: interpolate(), render() and check() calls, per type
+      parser.split: templates split into tokens
+      parser.resolve: resolve() calls
+      parser.resolve.iterations: passes over resolved strings
+      environment.find: Environment lookups
+      environment.find.miss: Environment lookups that found nothing
+      environment.find.scan: mounted scopes probed by Environment lookups
+      type_environment.merge: TypeEnvironment merges
+
+    Timers (seconds, including nested calls):
+      interpolate.<Type>: time spent computing interpolations, per type
+  """
+  _LOCK = threading.Lock()
+  _COUNTERS = defaultdict(int)
+  _TIMERS = defaultdict(float)
+  _ENABLED = os.environ.get('PYSTACHIO_INSTRUMENT', '') not in ('', '0')
+
+  @classmethod
+  def enable(cls):
+    cls._ENABLED = True
+
+  @classmethod
+  def disable(cls):
+    cls._ENABLED = False
+
+  @classmethod
+  def enabled(cls):
+    return cls._ENABLED
+
+  @classmethod
+  @contextmanager
+  def instrumented(cls, reset=True):
+    """
+      Enable instrumentation for the duration of a with block, by default
+      starting from zeroed counters and timers.
+    """
+    if reset:
+      cls.reset()
+    was_enabled, cls._ENABLED = cls._ENABLED, True
+    try:
+      yield cls
+    finally:
+      cls._ENABLED = was_enabled
+
+  @classmethod
+  def count(cls, name, increment=1):
+    with cls._LOCK:
+      cls._COUNTERS[name] += increment
+
+  @classmethod
+  def timed(cls, name, fn, *args):
+    """
+      Return fn(*args), adding the time it took to timer name.
+    """
+    start = default_timer()
+    try:
+      return fn(*args)
+    finally:
+      elapsed = default_timer() - start
+      with cls._LOCK:
+        cls._TIMERS[name] += elapsed
+
+  @classmethod
+  def reset(cls):
+    """
+      Zero the counters, the timers and the hit and miss counts of the named
+      caches, so that a snapshot covers only what happened since.
+    """
+    with cls._LOCK:
+      cls._COUNTERS.clear()
+      cls._TIMERS.clear()
+    for cache in LRUCache.named().values():
+      cache.reset_stats()
+
+  @classmethod
+  def snapshot(cls):
+    """
+      Return a dictionary of the counters, the timers and the statistics of the
+      named caches (see LRUCache.named):
+
+        {'counters': {'copy': 120, ...},
+         'timers': {'interpolate.Process': 0.0021, ...},
+         'caches': {'parser.splits': {'hits': 10, 'misses': 2, ...}, ...}}
+    """
+    with cls._LOCK:
+      counters, timers = dict(cls._COUNTERS), dict(cls._TIMERS)
+    return {
+      'counters': counters,
+      'timers': timers,
+      'caches': dict((name, cache.stats()) for name, cache in LRUCache.named().items()),
+    }
@@ -1,6 +1,7 @@
 import re
 from itertools import chain
 
+from pystachio.cache import LRUCache
 from pystachio.compatibility import Compatibility
 
 
@@ -23,6 +24,8 @@ class Namable(object):
   """
     An object that can be named/dereferenced.
   """
+  __slots__ = ()
+
   class Error(Exception): pass
 
   class Unnamable(Error):
@@ -59,7 +62,13 @@ class Namable(object):
 class Ref(object):
   """
     A reference into to a hierarchically named object.
+
+    Refs are immutable.  Ref.from_address interns its results, so repeated
+    lookups of the same address share a single Ref whose address and hash are
+    computed once.
   """
+  __slots__ = ('_components', '_address', '_hash', '_rest')
+
   # ref re
   # ^[^\d\W]\w*\Z
   _DEREF_RE = r'[^\d\W]\w*'
@@ -67,15 +76,22 @@ class Ref(object):
   _REF_RE = re.compile(r'(\.' + _DEREF_RE + r'|\[' + _INDEX_RE + r'\])')
   _VALID_START = re.compile(r'[a-zA-Z_]')
   _COMPONENT_SEPARATOR = '.'
+  INTERN_CACHE_SIZE = 65536
 
   class Component(object):
+    __slots__ = ('_value', '_hash')
+
     def __init__(self, value):
       self._value = value
+      self._hash = hash((self.__class__.__name__, value))
 
     @property
     def value(self):
       return self._value
 
+    def __hash__(self):
+      return self._hash
+
     def __eq__(self, other):
       return self.__class__ == other.__class__ and self.value == other.value
 
@@ -88,12 +104,17 @@ class Ref(object):
     def __gt__(self, other):
       return self.value > other.value
 
+    def __reduce__(self):
+      return (self.__class__, (self._value,))
+
   class Index(Component):
+    __slots__ = ()
     RE = re.compile('^[\w\-]+$')
     def __repr__(self):
       return '[%s]' % self._value
 
   class Dereference(Component):
+    __slots__ = ()
     RE = re.compile('^[^\d\W]\w*$')
     def __repr__(self):
       return '.%s' % self._value
@@ -110,9 +131,12 @@ class Ref(object):
 
   @staticmethod
   def from_address(address):
-    components = []
     if not address or not isinstance(address, Compatibility.stringy):
       raise Ref.InvalidRefError('Invalid address: %s' % repr(address))
+    return Ref._INTERNED.get(address, Ref._parse_address)
+
+  @staticmethod
+  def _parse_address(address):
     if not (address.startswith('[') or address.startswith('.')):
       if Ref._VALID_START.match(address[0]):
         components = Ref.split_components('.' + address)
@@ -123,7 +147,11 @@ class Ref(object):
     return Ref(components)
 
   def __init__(self, components):
-    self._components = components
+    self._components = tuple(components)
+    joined = ''.join(repr(comp) for comp in self._components)
+    self._address = joined[1:] if joined.startswith('.') else joined
+    self._hash = hash(self._address)
+    self._rest = None
 
   def components(self):
     return self._components
@@ -141,7 +169,9 @@ class Ref(object):
     return len(self.components()) == 0
 
   def rest(self):
-    return Ref(self.components()[1:])
+    if self._rest is None:
+      self._rest = Ref(self._components[1:])
+    return self._rest
 
   def __add__(self, other):
     sc = self.components()
@@ -176,11 +206,7 @@ class Ref(object):
     return [map_to_namable(spl) for spl in splits]
 
   def address(self):
-    joined = ''.join(str(comp) for comp in self._components)
-    if joined.startswith('.'):
-      return joined[1:]
-    else:
-      return joined
+    return self._address
 
   def __str__(self):
     return '{{%s}}' % self.address()
@@ -189,7 +215,10 @@ class Ref(object):
     return 'Ref(%s)' % self.address()
 
   def __eq__(self, other):
-    return self.components() == other.components()
+    return self is other or self._components == other.components()
+
+  def __ne__(self, other):
+    return not (self == other)
 
   @staticmethod
   def compare(self, other):
@@ -207,4 +236,16 @@ class Ref(object):
     return Ref.compare(self, other) == 1
 
   def __hash__(self):
-    return hash(str(self))
+    return self._hash
+
+  def __reduce__(self):
+    return (Ref, (self._components,))
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+
+Ref._INTERNED = LRUCache(Ref.INTERN_CACHE_SIZE, name='ref.interned')
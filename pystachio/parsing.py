@@ -1,7 +1,15 @@
+from contextlib import contextmanager
 import re
+import threading
 
+from pystachio.cache import LRUCache
 from pystachio.compatibility import Compatibility
+from pystachio.instrumentation import Instrumentation
 from pystachio.naming import Namable, Ref
+from pystachio.tracing import ResolutionTracer
+
+_stringify = str if Compatibility.PY3 else unicode
+
 
 class MustacheParser(object):
   """
@@ -11,17 +19,64 @@ class MustacheParser(object):
     To suppress parsing of individual tags, you can use {{&foo}} which emits '{{foo}}'
     instead of Ref('foo') or Ref('&foo').  As such, template variables cannot
     begin with '&'.
+
+    Parsed templates are kept in a bounded LRU cache shared by split, join and
+    resolve, so interpolating the same template repeatedly only tokenizes it
+    once.  See set_cache_size and cache_stats.
   """
 
   _ADDRESS_DELIMITER = '&'
   _MUSTACHE_RE = re.compile(r"{{(%c)?([^{}]+?)\1?}}" % _ADDRESS_DELIMITER)
   MAX_ITERATIONS = 100
+  DEFAULT_CACHE_SIZE = 8192
+  _CACHE = LRUCache(DEFAULT_CACHE_SIZE, name='parser.splits')
+  _RECORDER = threading.local()
 
   class Error(Exception): pass
   class Uninterpolatable(Error): pass
 
+  @classmethod
+  def set_cache_size(cls, size):
+    """
+      Bound the number of parsed templates retained.  A size of 0 disables caching.
+    """
+    cls._CACHE.resize(size)
+
+  @classmethod
+  def cache_stats(cls):
+    """
+      Return a dictionary of template cache hits, misses, size and capacity.
+    """
+    return cls._CACHE.stats()
+
+  @classmethod
+  def clear_cache(cls):
+    cls._CACHE.clear()
+
+  @classmethod
+  @contextmanager
+  def recording(cls):
+    """
+      Record the Refs looked up by resolve in this thread within a with block:
+
+        with MustacheParser.recording() as refs:
+          ...
+        # refs is the set of Refs looked up, whether or not they were bound.
+
+      Recordings nest; an enclosing recording also receives the inner one's Refs.
+    """
+    outer = getattr(cls._RECORDER, 'refs', None)
+    refs = cls._RECORDER.refs = set()
+    try:
+      yield refs
+    finally:
+      cls._RECORDER.refs = outer
+      if outer is not None:
+        outer.update(refs)
+
   @staticmethod
-  def split(string, keep_aliases=False):
+  def _tokenize(key):
+    string, keep_aliases = key
     splits = MustacheParser._MUSTACHE_RE.split(string)
     first_split = splits.pop(0)
     outsplits = [first_split] if first_split else []
@@ -38,31 +93,39 @@ class MustacheParser(object):
           k, splits[k]))
       if splits[k+2]:
         outsplits.append(splits[k+2])
-    return outsplits
+    return tuple(outsplits)
+
+  @staticmethod
+  def _splits(string, keep_aliases=False):
+    """
+      Return the cached, immutable token tuple for string.
+    """
+    if Instrumentation._ENABLED:
+      Instrumentation.count('parser.split')
+    return MustacheParser._CACHE.get((string, keep_aliases), MustacheParser._tokenize)
+
+  @staticmethod
+  def split(string, keep_aliases=False):
+    return list(MustacheParser._splits(string, keep_aliases=keep_aliases))
 
   @staticmethod
   def join(splits, *namables):
     """
       Interpolate strings.
 
-      :params splits: The output of Parser.split(string)
+      :params splits: The output of Parser.split(string), or a template string to be split
       :params namables: A sequence of Namable objects in which the interpolation should take place.
 
       Returns 2-tuple containing:
         joined string, list of unbound object ids (potentially empty)
     """
+    if isinstance(splits, Compatibility.stringy):
+      splits = MustacheParser._splits(splits)
     isplits = []
     unbound = []
     for ref in splits:
       if isinstance(ref, Ref):
-        resolved = False
-        for namable in namables:
-          try:
-            value = namable.find(ref)
-            resolved = True
-            break
-          except Namable.Error as e:
-            continue
+        resolved, value = MustacheParser._lookup(ref, namables)
         if resolved:
           isplits.append(value)
         else:
@@ -70,26 +133,151 @@ class MustacheParser(object):
           unbound.append(ref)
       else:
         isplits.append(ref)
-    return (''.join(map(str if Compatibility.PY3 else unicode, isplits)), unbound)
+    return (''.join(map(_stringify, isplits)), unbound)
+
+  @staticmethod
+  def _lookup(ref, namables):
+    """
+      Find ref in the first namable that can dereference it.
+
+      Returns 2-tuple containing:
+        whether or not the ref was found, the value found (or None)
+    """
+    if ResolutionTracer._ACTIVE:
+      tracer = ResolutionTracer.current()
+      if tracer is not None:
+        return tracer.lookup(ref, namables)
+    for namable in namables:
+      try:
+        return True, namable.find(ref)
+      except Namable.Error:
+        continue
+    return False, None
 
   @classmethod
   def resolve(cls, stream, *namables):
-    def iterate(st, keep_aliases=True):
-      refs = MustacheParser.split(st, keep_aliases=keep_aliases)
-      unbound = [ref for ref in refs if isinstance(ref, Ref)]
-      repl, interps = MustacheParser.join(refs, *namables)
-      rebound = [ref for ref in MustacheParser.split(repl, keep_aliases=keep_aliases)
-                 if isinstance(ref, Ref)]
-      return repl, interps, unbound
-
-    iterations = 0
-    for iteration in range(cls.MAX_ITERATIONS):
-      stream, interps, unbound = iterate(stream, keep_aliases=True)
-      if interps == unbound:
-        break
-    else:
+    """
+      Fully interpolate a string against namables.
+
+      Each Ref is looked up once; its value is recursively resolved before being
+      spliced back in, and the result is only re-split when the substitution
+      could have formed a new template, e.g. '{{foo[{{bar}}]}}'.  Aliases such as
+      {{&foo}} are preserved until the very end and then emitted as {{foo}}.
+
+      Returns 2-tuple containing:
+        resolved string, list of unbound Refs (potentially empty)
+
+      Raises MustacheParser.Uninterpolatable if a Ref (transitively) resolves to
+      itself or resolution nests more than MAX_ITERATIONS deep.
+    """
+    if Instrumentation._ENABLED:
+      Instrumentation.count('parser.resolve')
+    resolved = cls._resolve(stream, namables, frozenset(), {}, 0)
+    return cls.join(cls._splits(resolved, keep_aliases=False))
+
+  @classmethod
+  def _resolve(cls, stream, namables, visited, memo, depth):
+    """
+      Resolve stream with aliases kept.  visited holds the Refs currently being
+      resolved further up the stack; memo maps Refs to their fully resolved
+      string, or None if they are unbound.
+    """
+    if depth > cls.MAX_ITERATIONS:
       raise cls.Uninterpolatable('Unable to interpolate %s!  Maximum replacements reached.'
           % stream)
+    recorded = getattr(cls._RECORDER, 'refs', None)
+    for iteration in range(cls.MAX_ITERATIONS):
+      if Instrumentation._ENABLED:
+        Instrumentation.count('parser.resolve.iterations')
+      pieces = []
+      substituted = False
+      for token in cls._splits(stream, keep_aliases=True):
+        if not isinstance(token, Ref):
+          pieces.append(token)
+          continue
+        if recorded is not None:
+          recorded.add(token)
+        if token in visited:
+          raise cls.Uninterpolatable('Unable to interpolate %s!  %s refers to itself.'
+              % (stream, token))
+        if token in memo:
+          value = memo[token]
+        else:
+          found, value = cls._lookup(token, namables)
+          if found:
+            value = cls._resolve(_stringify(value), namables, visited | set([token]), memo,
+                depth + 1)
+          else:
+            value = None
+          memo[token] = value
+        if value is None:
+          pieces.append(_stringify(token))
+        else:
+          pieces.append(value)
+          substituted = True
+      stream = ''.join(pieces)
+      # Substituted values are already fully resolved, so another pass is only needed
+      # if braces left around (or inside) them might now form a new template.
+      if not substituted or not any('{' in piece or '}' in piece for piece in pieces):
+        return stream
+    raise cls.Uninterpolatable('Unable to interpolate %s!  Maximum replacements reached.'
+        % stream)
+
+  @classmethod
+  def free_refs(cls, stream, *namables):
+    """
+      Return the list of Refs that resolve(stream, *namables) would leave unbound.
+
+      The Refs are found by walking the cached splits of stream and of the values
+      its Refs are bound to, without building any resolved strings, except where
+      a substitution could form a new template (e.g. '{{foo[{{bar}}]}}'), in which
+      case stream is resolved.
+
+      Raises MustacheParser.Uninterpolatable under the same conditions as resolve.
+    """
+    refs = cls._free_refs(stream, namables, frozenset(), {})
+    if refs is None:
+      return cls.resolve(stream, *namables)[1]
+    return refs
+
+  @classmethod
+  def _free_refs(cls, stream, namables, visited, memo):
+    """
+      Return the unbound Refs of stream, or None if they can only be determined by
+      resolving it.  memo maps Refs to their unbound Refs (or None.)
+    """
+    free = []
+    for token in cls._splits(stream, keep_aliases=True):
+      if isinstance(token, Ref):
+        refs = cls._ref_free_refs(token, namables, visited, memo)
+        if refs is None:
+          return None
+        free.extend(ref for ref in refs if ref not in free)
+      elif '{' in token or '}' in token:
+        return None
+    return free
+
+  @classmethod
+  def _ref_free_refs(cls, ref, namables, visited, memo):
+    if ref in visited:
+      return None
+    if ref not in memo:
+      found, value = cls._lookup(ref, namables)
+      if not found:
+        refs = [ref]
+      elif hasattr(value, '_template_refs'):
+        # An Object, rendered in its own scopes: whatever it leaves unbound is
+        # then looked up here.
+        inner = value._template_refs()
+        refs = [] if inner is not None else None
+        for inner_ref in inner or ():
+          inner_refs = cls._ref_free_refs(inner_ref, namables, visited | set([ref]), memo)
+          if inner_refs is None:
+            refs = None
+            break
+          refs.extend(inner_refs)
+      else:
+        refs = cls._free_refs(_stringify(value), namables, visited | set([ref]), memo)
+      memo[ref] = refs
+    return memo[ref]
 
-    stream, _, unbound = iterate(stream, keep_aliases=False)
-    return stream, unbound
@@ -0,0 +1,152 @@
+"""
+  Incremental re-interpolation.
+
+  A RenderSession interpolates an object bound to an environment and records,
+  for every value in the tree, the Refs looked up while resolving it.  When
+  variables are rebound, only the values that looked up a rebound Ref (or a Ref
+  above or below one, e.g. {{mesos.instance}} when {{mesos}} is rebound) are
+  resolved again, and the interpolated subtrees of everything else are shared
+  with the previous result:
+
+    session = RenderSession(job, cluster={'version': '1.2'})
+    job, unbound = session.render()
+    job, unbound = session.update({'cluster': {'version': '1.3'}})
+"""
+
+from pystachio.base import Environment
+from pystachio.composite import Empty, Structural
+from pystachio.container import ListContainer, MapContainer
+from pystachio.parsing import MustacheParser
+
+
+def _related(ref, other):
+  """
+    True if one of ref and other is a prefix of (or equal to) the other.
+  """
+  rc, oc = ref.components(), other.components()
+  length = min(len(rc), len(oc))
+  return rc[:length] == oc[:length]
+
+
+class _Record(object):
+  """
+    The interpolation of one value in the tree: its interpolated value, unbound
+    Refs, the Refs it (or any of its children) looked up, and the records of its
+    children, if it is a container.
+  """
+  __slots__ = ('interpolated', 'unbound', 'refs', 'children')
+
+  def __init__(self, interpolated, unbound, refs, children=None):
+    self.interpolated = interpolated
+    self.unbound = unbound
+    self.refs = refs
+    self.children = children
+
+
+class RenderSession(object):
+  """
+    An object rendered against an environment that can be updated in place.
+
+    The arguments other than obj are dicts or Environments (and keyword
+    bindings), as accepted by Environment.  The session's scopes take priority
+    over any obj is already bound to, as with obj.bind(environment).
+  """
+
+  def __init__(self, obj, *args, **kw):
+    self._object = obj
+    self._environment = Environment(*args, **kw)
+    self._record = None
+    self.rendered = 0
+
+  @property
+  def environment(self):
+    return self._environment
+
+  def render(self):
+    """
+      Return the 2-tuple (interpolated object, list of unbound Refs) of the
+      object bound to the session's environment, as interpolate() would.
+    """
+    if self._record is None:
+      self.rendered = 0
+      self._record = self._render(self._root(), None, None)
+    return self._record.interpolated, list(self._record.unbound)
+
+  def update(self, *args, **kw):
+    """
+      Rebind variables in the session's environment and return the new result of
+      render(), re-interpolating only the values that depend on them.  rendered
+      is then the number of values that were resolved again.
+    """
+    changes = Environment(*args, **kw)
+    self._environment = Environment(self._environment, changes)
+    if self._record is None:
+      return self.render()
+    self.rendered = 0
+    changed = tuple(changes._table)
+    if changed:
+      self._record = self._render(self._root(), self._record, changed)
+    return self._record.interpolated, list(self._record.unbound)
+
+  def _root(self):
+    return self._object.bind(self._environment)
+
+  @staticmethod
+  def _affected(record, changed):
+    return any(_related(ref, key) for ref in record.refs for key in changed)
+
+  def _render(self, node, previous, changed):
+    """
+      Interpolate node, reusing previous (its record from the last render) where
+      it looked up none of the changed Refs.
+    """
+    if previous is not None and not self._affected(previous, changed):
+      return previous
+    if isinstance(node, Structural):
+      return self._render_struct(node, previous, changed)
+    elif isinstance(node, ListContainer):
+      return self._render_list(node, previous, changed)
+    elif isinstance(node, MapContainer):
+      return self._render_map(node, previous, changed)
+    with MustacheParser.recording() as refs:
+      interpolated, unbound = node.interpolate()
+    self.rendered += 1
+    return _Record(interpolated, tuple(unbound), frozenset(refs))
+
+  def _render_children(self, node, values, previous, changed):
+    scopes, modulo = node.scope_chain(), node.modulo()
+    records = []
+    for index, value in enumerate(values):
+      if value is Empty:
+        records.append(None)
+      else:
+        records.append(self._render(value._scoped(scopes, modulo),
+            previous.children[index] if previous is not None else None, changed))
+    return records
+
+  @staticmethod
+  def _collect(records):
+    unbound, refs = set(), set()
+    for record in records:
+      if record is not None:
+        unbound.update(record.unbound)
+        refs.update(record.refs)
+    return tuple(unbound), frozenset(refs)
+
+  def _render_struct(self, node, previous, changed):
+    records = self._render_children(node, node._values, previous, changed)
+    interpolated = node._from_values(tuple(
+        Empty if record is None else record.interpolated for record in records))
+    return _Record(interpolated, *self._collect(records), children=records)
+
+  def _render_list(self, node, previous, changed):
+    records = self._render_children(node, node._values, previous, changed)
+    interpolated = node.__class__([record.interpolated for record in records])
+    return _Record(interpolated, *self._collect(records), children=records)
+
+  def _render_map(self, node, previous, changed):
+    values = [value for pair in node._map for value in pair]
+    records = self._render_children(node, values, previous, changed)
+    interpolated = node.__class__(*[(records[k].interpolated, records[k + 1].interpolated)
+                                    for k in range(0, len(records), 2)])
+    return _Record(interpolated, *self._collect(records), children=records)
@@ -0,0 +1,236 @@
+import codecs
+import json
+import re
+
+from pystachio.compatibility import Compatibility
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CHARACTERS = frozenset('0123456789.eE+-')
+_NUMBER_TAIL = re.compile(r'[-+.eE0-9]+$')
+# A \uXXXX escape, possibly the high half of a surrogate pair, cut off by the end.
+_ESCAPE_TAIL = re.compile(r'u[0-9a-fA-F]{0,4}(\\(u[0-9a-fA-F]{0,4})?)?$')
+_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+
+
+def iter_json_values(fp, chunk_size=65536):
+  """
+    Incrementally decode JSON values from the file-like object fp, reading at most
+    chunk_size characters at a time.
+
+    If the document is a top-level JSON array, yield each of its elements;
+    otherwise treat it as a sequence of whitespace-separated values (e.g. JSON
+    Lines) and yield each value.  Only the value being decoded is held in memory.
+
+    Raises ValueError if the document is not valid JSON.
+  """
+  decoder = json.JSONDecoder()
+  reader = _Reader(fp, chunk_size)
+
+  reader.skip_whitespace()
+  if reader.peek() == '[':
+    reader.consume(1)
+    reader.skip_whitespace()
+    if reader.peek() == ']':
+      reader.consume(1)
+    else:
+      while True:
+        yield reader.decode(decoder)
+        reader.skip_whitespace()
+        delimiter = reader.peek()
+        reader.consume(1)
+        if delimiter == ']':
+          break
+        elif delimiter != ',':
+          raise ValueError('Expected , or ] at offset %d, got %r' % (reader.offset, delimiter))
+        reader.skip_whitespace()
+    reader.skip_whitespace()
+    if reader.peek():
+      raise ValueError('Extra data after JSON array at offset %d' % reader.offset)
+  else:
+    while reader.peek():
+      yield reader.decode(decoder)
+      reader.skip_whitespace()
+
+
+class _Reader(object):
+  """
+    A buffer over a file-like object that reads more text only when the pending
+    input cannot be decoded yet.
+  """
+
+  def __init__(self, fp, chunk_size):
+    self._fp = fp
+    self._chunk_size = chunk_size
+    self._decoder = None
+    self._buffer = ''
+    self._position = 0
+    self._consumed = 0
+    self._eof = False
+
+  @property
+  def offset(self):
+    return self._consumed + self._position
+
+  def _fill(self, size=None):
+    """
+      Append the next chunk (of size characters, by default chunk_size) to the
+      buffer, discarding consumed input.  Returns False at end of file.
+    """
+    if self._eof:
+      return False
+    chunk = self._fp.read(size or self._chunk_size)
+    if isinstance(chunk, bytes) and not isinstance(chunk, str):
+      if self._decoder is None:
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+      chunk = self._decoder.decode(chunk, final=not chunk)
+    if not chunk:
+      self._eof = True
+      return False
+    self._consumed += self._position
+    self._buffer = self._buffer[self._position:] + chunk
+    self._position = 0
+    return True
+
+  def peek(self):
+    """
+      Return the next character, or '' at end of input.
+    """
+    while self._position >= len(self._buffer):
+      if not self._fill():
+        return ''
+    return self._buffer[self._position]
+
+  def consume(self, count):
+    self._position += count
+
+  def skip_whitespace(self):
+    while True:
+      self._position = _WHITESPACE.match(self._buffer, self._position).end()
+      if self._position < len(self._buffer) or not self._fill():
+        return
+
+  def _truncated(self, error):
+    """
+      Whether a decoding error could be due to the value being cut off at the end
+      of the buffer, rather than to malformed input.
+    """
+    position = getattr(error, 'pos', None)
+    if position is None:
+      # Without a position (Python 2), assume it could be.
+      return True
+    tail = self._buffer[position:]
+    if not tail or error.msg.startswith('Unterminated string'):
+      return True
+    if error.msg.startswith('Invalid \\uXXXX escape'):
+      return _ESCAPE_TAIL.match(tail) is not None
+    return (any(literal.startswith(tail) for literal in _LITERALS) or
+            _NUMBER_TAIL.match(tail) is not None)
+
+  def _number_may_continue(self, value, end):
+    return (isinstance(value, Compatibility.numeric) and not isinstance(value, bool) and
+            (end == len(self._buffer) or self._buffer[end] in _NUMBER_CHARACTERS))
+
+  def decode(self, decoder):
+    """
+      Decode the next value.  A value is only accepted once it is followed by input
+      that cannot continue it (or the input is exhausted), so that e.g. a number
+      split across chunks is not cut short.
+
+      More input is only read while the value may be truncated; malformed input
+      raises ValueError immediately.  Each read is twice the size of the last, so
+      a value spanning many chunks is decoded in time linear in its size.
+    """
+    size = self._chunk_size
+    while True:
+      try:
+        value, end = decoder.raw_decode(self._buffer, self._position)
+      except ValueError as e:
+        if not self._truncated(e) or not self._fill(size):
+          raise
+        size *= 2
+        continue
+      if self._number_may_continue(value, end) and self._fill(size):
+        size *= 2
+        continue
+      self._position = end
+      return value
+
+
+_ENCODER = json.JSONEncoder()
+_encode_string = getattr(json.encoder, 'c_encode_basestring_ascii', None) or (
+    json.encoder.encode_basestring_ascii)
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def _encode_float(value):
+  if value != value or value in (float('inf'), float('-inf')):
+    return _ENCODER.encode(value)
+  return float.__repr__(value)
+
+
+_SCALAR_ENCODERS = dict((stringy, _encode_string) for stringy in Compatibility.stringy)
+_SCALAR_ENCODERS.update(((int, int.__repr__), (float, _encode_float)))
+
+
+def encode_scalar(value):
+  encode = _SCALAR_ENCODERS.get(type(value))
+  return encode(value) if encode else _ENCODER.encode(value)
+
+
+def encode_key(value):
+  """
+    Encode a Map key as json.dumps would: strings as-is, other scalars by their
+    JSON representation, quoted.
+  """
+  if not isinstance(value, Compatibility.stringy):
+    value = _ENCODER.encode(value)
+  return _encode_string(value)
+
+
+class _ChunkedWriter(object):
+  """
+    Buffer tokens and write them to fp in chunks of about chunk_size characters.
+  """
+
+  def __init__(self, fp, chunk_size):
+    self._fp = fp
+    self._chunk_size = chunk_size
+    self._pending = []
+    self._pending_size = 0
+
+  def write(self, token):
+    self._pending.append(token)
+    self._pending_size += len(token)
+    if self._pending_size >= self._chunk_size:
+      self.flush()
+
+  def flush(self):
+    if self._pending:
+      self._fp.write(''.join(self._pending))
+      self._pending, self._pending_size = [], 0
+
+
+def dump(obj, fp, chunk_size=DEFAULT_CHUNK_SIZE):
+  """
+    Write the JSON encoding of obj, a pystachio Object, to the file-like object
+    fp in writes of about chunk_size characters.
+
+    The interpolated object tree is walked directly, so the output is identical to
+    json.dump(obj.interpolate()[0].get(), fp) without building the intermediate
+    tree of frozendicts and tuples.
+  """
+  interpolated, _ = obj.interpolate()
+  writer = _ChunkedWriter(fp, chunk_size)
+  interpolated._json_encode(writer.write)
+  writer.flush()
+
+
+def dumps(obj):
+  """
+    Return the JSON encoding of obj, a pystachio Object.  See dump.
+  """
+  interpolated, _ = obj.interpolate()
+  tokens = []
+  interpolated._json_encode(tokens.append)
+  return ''.join(tokens)
@@ -0,0 +1,133 @@
+"""
+  Tracing of Ref resolution.
+
+  While a ResolutionTracer is active in a thread, every Ref looked up by
+  MustacheParser in that thread is recorded with the path of the value being
+  interpolated, the scope that bound it and the cost of finding it:
+
+    with ResolutionTracer.trace() as tracer:
+      job.interpolate()
+    tracer.dump(sys.stderr)
+
+  writes one JSON object per lookup, e.g.
+
+    {"mount": "cluster", "path": "processes[0].cmdline", "probes": 11,
+     "ref": "cluster.version", "scope": 11, "scope_type": "Environment",
+     "seconds": 2.1e-05}
+
+  where scope is the index of the scope in the chain that bound the Ref (None if
+  it is unbound), mount is the key mounted in that Environment that satisfied it
+  and probes is the number of scopes that failed to bind it first.  Memoized
+  interpolations are recomputed while a tracer is active, so objects that were
+  interpolated (or checked) before tracing began are traced too.
+  Map values are traced under their interpolated keys, e.g. env[PORT] for a
+  '{{name}}' key bound to PORT; the lookups of a Map's keys have the Map's path.
+"""
+
+from contextlib import contextmanager
+import json
+import threading
+from timeit import default_timer
+
+from pystachio.naming import Namable
+
+
+class ResolutionTracer(object):
+  _LOCAL = threading.local()
+  # The number of tracers active in any thread, so untraced code only tests this.
+  _ACTIVE = 0
+  _LOCK = threading.Lock()
+
+  def __init__(self):
+    self.records = []
+    self._path = []
+
+  @classmethod
+  def current(cls):
+    """
+      Return the tracer active in this thread, or None.
+    """
+    if not cls._ACTIVE:
+      return None
+    return getattr(cls._LOCAL, 'tracer', None)
+
+  @classmethod
+  @contextmanager
+  def trace(cls, tracer=None):
+    """
+      Trace resolution in this thread for the duration of a with block, yielding
+      the tracer (a new one unless given.)
+    """
+    tracer = tracer or cls()
+    outer = getattr(cls._LOCAL, 'tracer', None)
+    cls._LOCAL.tracer = tracer
+    with cls._LOCK:
+      ResolutionTracer._ACTIVE += 1
+    try:
+      yield tracer
+    finally:
+      with cls._LOCK:
+        ResolutionTracer._ACTIVE -= 1
+      cls._LOCAL.tracer = outer
+
+  def path(self):
+    """
+      The path of the value being interpolated, e.g. 'processes[0].cmdline'.
+    """
+    return ''.join(segment if index == 0 or segment.startswith('[') else '.' + segment
+                   for index, segment in enumerate(self._path))
+
+  def within(self, segment, fn, *args):
+    """
+      Return fn(*args), with segment (e.g. 'name' or '[0]') appended to the path.
+    """
+    self._path.append(segment)
+    try:
+      return fn(*args)
+    finally:
+      self._path.pop()
+
+  def lookup(self, ref, namables):
+    """
+      Find ref in the first of namables that can dereference it, as
+      MustacheParser._lookup does, recording the lookup.  Lookups without any
+      scopes (e.g. of values interpolated outside of their parents) are not
+      recorded.
+    """
+    if not namables:
+      return False, None
+    start = default_timer()
+    found, value, index, mount = False, None, None, None
+    for probe, namable in enumerate(namables):
+      try:
+        find_mount = getattr(namable, 'find_mount', None)
+        if find_mount is not None:
+          mount, value = find_mount(ref)
+        else:
+          value = namable.find(ref)
+      except Namable.Error:
+        continue
+      found, index = True, probe
+      break
+    seconds = default_timer() - start
+    self.records.append({
+      'path': self.path(),
+      'ref': ref.address(),
+      'scope': index,
+      'scope_type': namables[index].__class__.__name__ if found else None,
+      'mount': mount.address() if mount is not None else None,
+      'probes': index if found else len(namables),
+      'seconds': seconds,
+    })
+    return found, value
+
+  def dump(self, fp):
+    """
+      Write the records to the file-like object fp as JSON lines.
+    """
+    for record in self.records:
+      fp.write(json.dumps(record, sort_keys=True))
+      fp.write('\n')
+
+  def dumps(self):
+    return ''.join(json.dumps(record, sort_keys=True) + '\n' for record in self.records)
@@ -1,6 +1,18 @@
+from contextlib import contextmanager
 import functools
 from inspect import isclass
-
+import os
+import sys
+import threading
+import weakref
+
+try:
+  import copyreg
+except ImportError:
+  import copy_reg as copyreg
+
+from pystachio.cache import LRUCache
+from pystachio.instrumentation import Instrumentation
 from pystachio.naming import Ref, Namable, frozendict
 
 class TypeCheck(object):
@@ -12,7 +24,8 @@ class TypeCheck(object):
 
   @staticmethod
   def success():
-    return TypeCheck(True, "")
+    # TypeChecks are immutable, so successes share one instance.
+    return TypeCheck.SUCCESS
 
   @staticmethod
   def failure(msg):
@@ -35,6 +48,9 @@ class TypeCheck(object):
       return 'TypeCheck(FAILED): %s' % self._message
 
 
+TypeCheck.SUCCESS = TypeCheck(True, "")
+
+
 class TypeFactoryType(type):
   _TYPE_FACTORIES = {}
 
@@ -48,6 +64,69 @@ class TypeFactoryType(type):
       return new_type
 
 
+class TypeRegistry(object):
+  """
+    An opt-in, process-wide registry of reified types keyed on their serialized
+    type tuple.  While enabled, reifying a schema that has already been reified
+    (e.g. calling Map(String, Integer) twice) returns the existing class rather
+    than creating a new one.  Classes are held weakly.
+
+    Enable with TypeRegistry.enable(), within a TypeRegistry.canonical() block,
+    or by setting PYSTACHIO_CANONICAL_TYPES=1 in the environment.
+  """
+  _LOCK = threading.Lock()
+  _TYPES = weakref.WeakValueDictionary()
+  _ENABLED = os.environ.get('PYSTACHIO_CANONICAL_TYPES', '') not in ('', '0')
+
+  @classmethod
+  def enable(cls):
+    cls._ENABLED = True
+
+  @classmethod
+  def disable(cls):
+    cls._ENABLED = False
+
+  @classmethod
+  def enabled(cls):
+    return cls._ENABLED
+
+  @classmethod
+  @contextmanager
+  def canonical(cls):
+    """
+      Enable the registry for the duration of a with block.
+    """
+    was_enabled, cls._ENABLED = cls._ENABLED, True
+    try:
+      yield cls
+    finally:
+      cls._ENABLED = was_enabled
+
+  @classmethod
+  def lookup(cls, type_tuple):
+    with cls._LOCK:
+      return cls._TYPES.get(type_tuple)
+
+  @classmethod
+  def register(cls, type_tuple, reified_type):
+    """
+      Register reified_type under type_tuple, returning the canonical class (which
+      may have been registered concurrently by another thread.)
+    """
+    with cls._LOCK:
+      return cls._TYPES.setdefault(type_tuple, reified_type)
+
+  @classmethod
+  def clear(cls):
+    with cls._LOCK:
+      cls._TYPES.clear()
+
+  @classmethod
+  def size(cls):
+    with cls._LOCK:
+      return len(cls._TYPES)
+
+
 TypeFactoryClass = TypeFactoryType('TypeFactoryClass', (object,), {})
 class TypeFactory(TypeFactoryClass):
   @staticmethod
@@ -68,6 +147,14 @@ class TypeFactory(TypeFactoryClass):
     """
     raise NotImplementedError("create unimplemented for: %s" % repr(type_parameters))
 
+  @staticmethod
+  def dependencies(*type_parameters):
+    """
+      Return the serialized types that the type produced from type_parameters
+      reifies as part of its creation.
+    """
+    return ()
+
   @staticmethod
   def new(type_dict, type_factory, *type_parameters):
     """
@@ -76,8 +163,18 @@ class TypeFactory(TypeFactoryClass):
     type_tuple = (type_factory,) + type_parameters
     if type_tuple not in type_dict:
       factory = TypeFactory.get_factory(type_factory)
-      reified_type = factory.create(type_dict, *type_parameters)
-      type_dict[type_tuple] = reified_type
+      canonical = TypeRegistry.enabled()
+      reified_type = TypeRegistry.lookup(type_tuple) if canonical else None
+      if reified_type is not None:
+        # Deposit the types this one depends upon, as creating it would have.
+        type_dict[type_tuple] = reified_type
+        for dependency in factory.dependencies(*type_parameters):
+          TypeFactory.new(type_dict, *dependency)
+      else:
+        reified_type = factory.create(type_dict, *type_parameters)
+        if canonical:
+          reified_type = TypeRegistry.register(type_tuple, reified_type)
+        type_dict[type_tuple] = reified_type
     return type_dict[type_tuple]
 
   @staticmethod
@@ -102,10 +199,9 @@ class TypeFactory(TypeFactoryClass):
     return deposit
 
   @staticmethod
-  def load_json(json_list, into=None):
+  def type_tuple(json_list):
     """
-      Determine all types touched by loading the type and deposit them into
-      the particular namespace.
+      Convert a JSON-decoded type schema back into a serialized type tuple.
     """
     def l2t(obj):
       if isinstance(obj, list):
@@ -114,10 +210,26 @@ class TypeFactory(TypeFactoryClass):
         return frozendict(obj)
       else:
         return obj
-    return TypeFactory.load(l2t(json_list), into=into)
+    return l2t(json_list)
+
+  @staticmethod
+  def load_json(json_list, into=None):
+    """
+      Determine all types touched by loading the type and deposit them into
+      the particular namespace.
+    """
+    return TypeFactory.load(TypeFactory.type_tuple(json_list), into=into)
 
   @staticmethod
-  def load_file(filename, into=None):
+  def load_file(filename, into=None, cache_dir=None):
+    """
+      Load the type schema in filename.  If cache_dir is given, the parsed schema
+      is cached there and reused while the file is unchanged (see
+      pystachio.bundle.)
+    """
+    if cache_dir is not None:
+      from pystachio.bundle import SchemaBundle
+      return SchemaBundle([filename], cache_dir).load(into=into)
     import json
     with open(filename) as fp:
       return TypeFactory.load_json(json.load(fp), into=into)
@@ -125,20 +237,48 @@ class TypeFactory(TypeFactoryClass):
 
 class TypeMetaclass(type):
   def __instancecheck__(cls, other):
+    if getattr(other, '__class__', None) is cls:
+      return True
     if not hasattr(other, 'type_parameters'):
       return False
     if not hasattr(other, '__class__'):
       return False
     if cls.__name__ != other.__class__.__name__:
       return False
-    return cls.type_factory() == other.type_factory() and (
-      cls.type_parameters() == other.type_parameters())
+    if cls.type_fingerprint() != other.type_fingerprint():
+      return False
+    return cls.serialize_type() == other.serialize_type()
 
   def __new__(mcls, name, parents, attributes):
     return type.__new__(mcls, name, parents, attributes)
 
+  # Types that are globals of their module (e.g. Structs declared at module level)
+  # are pickled by name.  Other reified types are pickled as their serialized type
+  # and reified again when unpickled; equal types unpickled while the first is
+  # still alive are the same class.
+  _UNPICKLED = weakref.WeakValueDictionary()
+  _UNPICKLE_LOCK = threading.Lock()
+
+  @staticmethod
+  def _reduce(cls):
+    module = sys.modules.get(cls.__module__)
+    if getattr(module, cls.__name__, None) is cls:
+      return cls.__name__
+    return (_unpickle_type, (cls.serialize_type(),))
+
+
+# Unpicklers are module-level functions, since Python 2 cannot pickle staticmethods.
+def _unpickle_type(type_tuple):
+  with TypeMetaclass._UNPICKLE_LOCK:
+    return TypeFactory.new(TypeMetaclass._UNPICKLED, *type_tuple)
+
+
+copyreg.pickle(TypeMetaclass, TypeMetaclass._reduce)
+
 
 class Type(object):
+  __slots__ = ()
+
   @classmethod
   def type_factory(cls):
     """ Return the name of the factory that produced this class. """
@@ -151,7 +291,27 @@ class Type(object):
 
   @classmethod
   def serialize_type(cls):
-    return (cls.type_factory(),) + cls.type_parameters()
+    """
+      Return the serialized type tuple.  Reified types are immutable, so this is
+      computed once per class and cached on it.
+    """
+    serialized = cls.__dict__.get('_SERIALIZED_TYPE')
+    if serialized is None:
+      serialized = (cls.type_factory(),) + cls.type_parameters()
+      setattr(cls, '_SERIALIZED_TYPE', serialized)
+    return serialized
+
+  @classmethod
+  def type_fingerprint(cls):
+    """
+      Return a hash of the serialized type, stable for the life of the process.
+      Types with equal serializations have equal fingerprints.
+    """
+    fingerprint = cls.__dict__.get('_TYPE_FINGERPRINT')
+    if fingerprint is None:
+      fingerprint = hash(cls.serialize_type())
+      setattr(cls, '_TYPE_FINGERPRINT', fingerprint)
+    return fingerprint
 
   @classmethod
   def dump(cls, fp):
@@ -167,6 +327,21 @@ class Type(object):
 
 
 class TypeEnvironment(object):
+  """
+    An immutable set of types (optionally bound to names) that an Object is
+    declared to be provided with, e.g. via @Provided.
+
+    Environments are identified by the set of their serialized bindings, so
+    merges and the coverage of Refs are memoized in caches shared by all
+    environments with the same bindings.
+  """
+  __slots__ = ('_unbound_types', '_bound_types', '_bound_refs', '_key')
+
+  MERGE_CACHE_SIZE = 4096
+  _MERGES = LRUCache(MERGE_CACHE_SIZE, name='type_environment.merge')
+  COVERS_CACHE_SIZE = 16384
+  _COVERS = LRUCache(COVERS_CACHE_SIZE, name='type_environment.covers')
+
   @staticmethod
   def deserialize(klazz_bindings, type_dict):
     unbound_types = []
@@ -188,12 +363,28 @@ class TypeEnvironment(object):
         raise TypeError('Type annotations must be subtypes of Namable, got %s instead!' % repr(typ))
     self._unbound_types = types
     self._bound_types = bound_types
+    self._bound_refs = tuple((Ref.from_address(name), typ) for name, typ in bound_types.items())
+    self._key = frozenset(self.serialize())
 
   def merge(self, other):
-    self_serialized = self.serialize()
-    other_serialized = other.serialize()
-    combined = set(self_serialized + other_serialized)
-    return TypeEnvironment.deserialize(tuple(combined), {})
+    if Instrumentation._ENABLED:
+      Instrumentation.count('type_environment.merge')
+    if other._key <= self._key:
+      return self
+    if self._key <= other._key:
+      return other
+    return TypeEnvironment._MERGES.get((self._key, other._key),
+        lambda key: TypeEnvironment._union(self, other))
+
+  @staticmethod
+  def _union(first, second):
+    unbound_types = {}
+    bound_types = {}
+    for environment in (first, second):
+      for typ in environment._unbound_types:
+        unbound_types.setdefault(typ.serialize_type(), typ)
+      bound_types.update(environment._bound_types)
+    return TypeEnvironment(*unbound_types.values(), **bound_types)
 
   def serialize(self):
     serialized_bindings = []
@@ -207,16 +398,40 @@ class TypeEnvironment(object):
     """
       Does this TypeEnvironment cover the ref?
     """
+    if not self._key:
+      return False
+    return TypeEnvironment._COVERS.get((self._key, ref), lambda key: self._compute_covers(ref))
+
+  def _compute_covers(self, ref):
     for binding in self._unbound_types:
       if binding.provides(ref):
         return True
-    for bound_name, binding in self._bound_types.items():
-      scoped_ref = Ref.from_address(bound_name).scoped_to(ref)
+    for bound_ref, binding in self._bound_refs:
+      scoped_ref = bound_ref.scoped_to(ref)
       if scoped_ref is not None and binding.provides(scoped_ref):
         return True
     return False
 
+  def __reduce__(self):
+    return (_unpickle_type_environment, (self._unbound_types, self._bound_types))
+
+  def __eq__(self, other):
+    return isinstance(other, TypeEnvironment) and self._key == other._key
+
+  def __ne__(self, other):
+    return not (self == other)
+
+  def __hash__(self):
+    return hash(self._key)
+
   def __str__(self):
     return 'TypeEnvironment(%s, %s)' % (
       ' '.join(unbound.__name__ for unbound in self._unbound_types),
       ' '.join('%s=>%s' % (name, bound.__name__) for name, bound in self._bound_types.items()))
+
+
+TypeEnvironment.EMPTY = TypeEnvironment()
+
+
+def _unpickle_type_environment(types, bound_types):
+  return TypeEnvironment(*types, **bound_types)
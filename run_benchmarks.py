@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+  Micro-benchmarks for the pystachio interpolation and type-checking hot paths.
+
+  Generates synthetic Task/Process/Resources configurations and reports the
+  throughput and peak memory of each benchmark as JSON, e.g.
+
+    python run_benchmarks.py --processes 200 --depth 8 --output before.json
+    python run_benchmarks.py --processes 200 --depth 8 --compare before.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from pystachio import (
+  Default,
+  Environment,
+  Float,
+  Integer,
+  List,
+  Map,
+  MustacheParser,
+  Ref,
+  Required,
+  String,
+  Struct,
+  TypeFactory)
+
+
+class Resources(Struct):
+  cpu  = Required(Float)
+  ram  = Required(Integer)
+  disk = Default(Integer, 2 * 2**30)
+
+
+class Process(Struct):
+  name         = Required(String)
+  cmdline      = Required(String)
+  resources    = Required(Resources)
+  env          = Map(String, String)
+  max_failures = Default(Integer, 1)
+
+
+class Task(Struct):
+  name         = Required(String)
+  processes    = Required(List(Process))
+  resources    = Resources
+  max_failures = Default(Integer, 1)
+
+
+def template_chain(depth):
+  """
+    A dictionary of variables v0 .. v{depth} where each variable refers to the
+    next, so resolving {{v0}} requires depth nested substitutions.
+  """
+  chain = dict(('v%d' % k, '{{v%d}}-%d' % (k + 1, k)) for k in range(depth))
+  chain['v%d' % depth] = 'leaf'
+  return chain
+
+
+def nested_environment(width, depth):
+  """
+    An Environment with `width` mounts at each of `depth` levels, e.g.
+    cluster.k0.k1....value.
+  """
+  def level(d):
+    if d == depth:
+      return {'value': d}
+    return dict(('k%d' % k, level(d + 1)) for k in range(width))
+  return Environment(cluster = level(0))
+
+
+def make_task(processes, depth):
+  """
+    A Task with `processes` Processes whose command lines reference task,
+    process and environment variables, the last through a chain of `depth`.
+  """
+  process = Process(
+    name = '{{task.name}}_{{process.id}}',
+    cmdline = 'run --name={{name}} --port={{mesos.port}} --var={{v0}} --cpu={{resources.cpu}}',
+    resources = Resources(cpu = '{{process.cpu}}', ram = 2**26),
+    env = {'HOME': '/var/{{task.name}}', 'INSTANCE': '{{mesos.instance}}'})
+  return Task(
+    name = 'task_{{mesos.instance}}',
+    processes = [process.bind(process = {'id': k, 'cpu': 0.5 + k % 4})
+                 for k in range(processes)],
+    resources = Resources(cpu = processes * 1.0, ram = processes * 2**26)
+  ).bind(template_chain(depth), task = {'name': 'bench'})
+
+
+def bench(fn, min_time, min_iterations=3):
+  """
+    Run fn repeatedly for at least min_time seconds and min_iterations iterations.
+    Returns (iterations, total seconds.)
+  """
+  fn()  # warm up caches shared across iterations (templates, refs, types.)
+  iterations, start = 0, time.time()
+  while True:
+    fn()
+    iterations += 1
+    elapsed = time.time() - start
+    if elapsed >= min_time and iterations >= min_iterations:
+      return iterations, elapsed
+
+
+def peak_memory(fn):
+  if tracemalloc is None:
+    return None
+  gc.collect()
+  tracemalloc.start()
+  try:
+    fn()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+def benchmarks(processes, depth):
+  """
+    Return a list of (name, callable) benchmarks.  Each callable works on a fresh
+    copy of its input so per-instance memoization does not hide the work measured.
+  """
+  task = make_task(processes, depth)
+  mesos = {'mesos': {'instance': 3, 'port': 8080}}
+  bound = task.bind(mesos)
+  rendered, _ = bound.interpolate()
+  rendered_json = rendered.json_dumps()
+  task_schema = Task.serialize_type()
+  environment = nested_environment(width=4, depth=depth)
+  hit = Ref.from_address('cluster' + '.k1' * depth + '.value')
+  miss = Ref.from_address('cluster' + '.k1' * depth + '.missing')
+  chain = Environment(template_chain(depth))
+  chain_template = '{{v0}} and {{v%d}}' % (depth // 2)
+
+  def environment_find():
+    environment.find(hit)
+    try:
+      environment.find(miss)
+    except Exception:
+      pass
+
+  return [
+    ('interpolate', lambda: bound.copy().interpolate()),
+    ('check', lambda: bound.copy().check()),
+    ('bind_mod', lambda: task.copy() % mesos),
+    ('json_dumps', lambda: rendered.copy().json_dumps()),
+    ('json_loads', lambda: Task.json_loads(rendered_json)),
+    ('type_factory_load', lambda: TypeFactory.load(task_schema)),
+    ('environment_find', environment_find),
+    ('mustache_resolve', lambda: MustacheParser.resolve(chain_template, chain)),
+  ]
+
+
+def run(args):
+  results = {}
+  for name, fn in benchmarks(args.processes, args.depth):
+    if args.filter and not any(f in name for f in args.filter):
+      continue
+    iterations, elapsed = bench(fn, args.min_time)
+    results[name] = {
+      'iterations': iterations,
+      'seconds': elapsed,
+      'ops_per_second': iterations / elapsed,
+      'usec_per_op': 1e6 * elapsed / iterations,
+      'peak_memory_bytes': peak_memory(fn),
+    }
+  return {
+    'parameters': {'processes': args.processes, 'depth': args.depth,
+                   'min_time': args.min_time},
+    'python': '%s %s' % (platform.python_implementation(), platform.python_version()),
+    'timestamp': time.time(),
+    'results': results,
+  }
+
+
+def compare(report, baseline):
+  """
+    Return lines describing the change in per-op time against a baseline report.
+  """
+  lines = []
+  for name, result in sorted(report['results'].items()):
+    before = baseline.get('results', {}).get(name)
+    if before is None:
+      lines.append('%-20s %12.1f usec/op (no baseline)' % (name, result['usec_per_op']))
+      continue
+    ratio = result['usec_per_op'] / before['usec_per_op']
+    lines.append('%-20s %12.1f usec/op  was %12.1f  (%.2fx)' % (
+      name, result['usec_per_op'], before['usec_per_op'], ratio))
+  return lines
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Run pystachio micro-benchmarks.')
+  parser.add_argument('--processes', type=int, default=100,
+                      help='Number of Processes in the synthetic Task.')
+  parser.add_argument('--depth', type=int, default=5,
+                      help='Depth of template chains and nested Environments.')
+  parser.add_argument('--min-time', type=float, default=0.5,
+                      help='Minimum number of seconds to run each benchmark.')
+  parser.add_argument('--filter', action='append', default=[],
+                      help='Only run benchmarks whose name contains this string.')
+  parser.add_argument('--output', help='Write the JSON report to this file.')
+  parser.add_argument('--compare', help='Compare against a previous JSON report.')
+  args = parser.parse_args(argv[1:])
+
+  report = run(args)
+  encoded = json.dumps(report, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, 'w') as fp:
+      fp.write(encoded + '\n')
+  else:
+    print(encoded)
+  if args.compare:
+    with open(args.compare) as fp:
+      baseline = json.load(fp)
+    for line in compare(report, baseline):
+      sys.stderr.write(line + '\n')
+
+
+if __name__ == '__main__':
+  main(sys.argv)
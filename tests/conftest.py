@@ -0,0 +1,7 @@
+import sys
+
+collect_ignore = []
+
+# pystachio.aio uses async def; its tests also need asyncio.run (3.7.)
+if sys.version_info < (3, 7):
+  collect_ignore.append('test_aio.py')
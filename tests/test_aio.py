@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from pystachio import Integer, List, Ref, String, Struct
+from pystachio.aio import AsyncNamable, prefetch
+
+
+class Process(Struct):
+  name = String
+  cmdline = String
+  port = Integer
+
+
+class Job(Struct):
+  name = String
+  processes = List(Process)
+
+
+class Store(AsyncNamable):
+  def __init__(self, values):
+    self.values = values
+    self.calls = []
+
+  async def fetch(self, refs):
+    self.calls.append(sorted(ref.address() for ref in refs))
+    await asyncio.sleep(0)
+    return dict((ref, self.values[ref.address()]) for ref in refs
+                if ref.address() in self.values)
+
+
+def make_job():
+  return Job(
+    name = '{{cluster.name}}-{{role}}',
+    processes = [
+      Process(name = 'p0', cmdline = 'run --secret={{secret.token}}', port = '{{ports.http}}'),
+      Process(name = 'p1', cmdline = 'run {{role}}', port = 8080)])
+
+
+def test_ainterpolate_batches_fetches():
+  secrets = Store({'secret.token': 's3cr3t', 'role': 'shadowed'})
+  metadata = Store({'cluster.name': 'west', 'role': 'www', 'ports.http': '{{base_port}}',
+                    'base_port': 8000})
+  interpolated, unbound = asyncio.run(make_job().ainterpolate(secrets, metadata))
+  assert unbound == []
+  assert interpolated.name() == String('west-shadowed')
+  assert interpolated.processes()[0].cmdline() == String('run --secret=s3cr3t')
+  assert interpolated.processes()[0].port() == Integer(8000)
+
+  # One call per provider for the refs of the object, and one for the refs the
+  # fetched values introduced.
+  assert secrets.calls == metadata.calls == [
+    ['cluster.name', 'ports.http', 'role', 'secret.token'], ['base_port']]
+
+
+def test_ainterpolate_unbound():
+  metadata = Store({'cluster.name': 'west'})
+  interpolated, unbound = asyncio.run(make_job().ainterpolate(metadata))
+  assert interpolated.name() == String('west-{{role}}')
+  assert set(unbound) == set(Ref.from_address(address)
+                             for address in ('role', 'secret.token', 'ports.http'))
+  assert len(metadata.calls) == 1
+
+  job = make_job().bind(role='www', secret={'token': 'x'}, ports={'http': 80},
+                        cluster={'name': 'east'})
+  assert asyncio.run(job.ainterpolate(metadata)) == job.interpolate()
+  assert len(metadata.calls) == 1
+
+
+def test_prefetch_errors_propagate():
+  class Failing(AsyncNamable):
+    async def fetch(self, refs):
+      raise KeyError('unavailable')
+
+  with pytest.raises(KeyError):
+    asyncio.run(prefetch(make_job(), Failing()))
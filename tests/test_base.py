@@ -1,9 +1,10 @@
 import pytest
-from pystachio.base import Object, Environment
+from pystachio.base import Object, Environment, ScopeChain
 from pystachio.naming import Ref, Namable
 from pystachio.basic import Integer, String
 from pystachio.container import List, Map
 from pystachio.composite import Struct
+from pystachio.instrumentation import Instrumentation
 
 def dtd(d):
   return dict((Ref.from_address(key), str(val)) for key, val in d.items())
@@ -93,6 +94,30 @@ def test_environment_provides():
   assert not ce.provides(ref('composite.unioned.anythingelse'))
 
 
+def test_environment_mount_priority():
+  class Inner(Struct):
+    c = String
+    d = String
+
+  class Outer(Struct):
+    b = Inner
+
+  oe = Environment({'a': Outer(b = Inner(c = 'outer', d = 'outer'))},
+                   {'a.b': Inner(c = 'inner')})
+  assert oe.find(ref('a.b.c')) == String('inner')
+  assert oe.find(ref('a.b.d')) == String('outer'), 'should fall back to shorter mounts'
+  assert oe.provides(ref('a.b.d'))
+  with pytest.raises(Namable.NotFound):
+    oe.find(ref('a.b.e'))
+  assert not oe.provides(ref('a.b.e'))
+  assert not oe.provides(ref('x.b.c'))
+
+  many = Environment(dict(('key%d' % k, {'value': k}) for k in range(100)))
+  assert many.find(ref('key42.value')) == '42'
+  with pytest.raises(Namable.NotFound):
+    many.find(ref('key42.value.other'))
+
+
 def test_environment_merge():
   oe1 = Environment(a = 1)
   oe2 = Environment(b = 2)
@@ -146,3 +171,84 @@ def test_object_unimplementeds():
     oc = o.copy()
   with pytest.raises(NotImplementedError):
     oi = o.interpolate()
+
+
+def test_ainterpolate_requires_async(monkeypatch):
+  from pystachio.compatibility import Compatibility
+  monkeypatch.setattr(Compatibility, 'ASYNC', False)
+  with pytest.raises(RuntimeError):
+    String('{{a}}').ainterpolate()
+
+
+def test_scope_chain():
+  e1, e2, e3 = Environment(a = 1), Environment(a = 2), Environment(a = 3)
+  assert not ScopeChain.EMPTY
+  assert ScopeChain.EMPTY.append([]) is ScopeChain.EMPTY
+  chain = ScopeChain([e2])
+  assert ScopeChain.EMPTY.prepend(chain) is chain
+  prepended = chain.prepend([e1])
+  appended = prepended.append([e3])
+  assert chain.scopes() == (e2,), 'chains should be persistent'
+  assert prepended.scopes() == (e1, e2)
+  assert appended.scopes() == (e1, e2, e3)
+  assert len(appended) == 3
+  assert list(appended.append(appended)) == [e1, e2, e3, e1, e2, e3]
+
+  deep = ScopeChain.EMPTY
+  for _ in range(5000):
+    deep = deep.prepend([e1])
+  assert len(deep.scopes()) == 5000
+
+
+def test_object_views_share_data():
+  s = String('{{a}}')
+  bound = s.bind(a = 1)
+  rebound = bound.bind(a = 2).in_scope(a = 3)
+  assert s.scopes() == []
+  assert len(bound.scopes()) == 1
+  assert len(rebound.scopes()) == 3
+  assert rebound.scopes()[1] is bound.scopes()[0]
+  assert bound._value is s._value
+  assert (s, bound, rebound) == (String('{{a}}'), String('1'), String('2'))
+
+  l = List(String)(['{{a}}', 'b'])
+  lb = l.bind(a = 'c')
+  assert lb._values is l._values
+  assert lb == List(String)(['c', 'b'])
+  assert l == List(String)(['{{a}}', 'b'])
+
+
+def test_interpolation_is_memoized():
+  class Process(Struct):
+    name = String
+    cmdline = String
+
+  processes = List(Process)([Process(name = 'p%d' % k, cmdline = '{{name}} {{port}}')
+                             for k in range(50)])
+  first, unbound = processes.interpolate()
+  second, unbound2 = processes.interpolate()
+  assert first is second
+  assert unbound == unbound2 == [ref('port')]
+  unbound.append('garbage')
+  assert processes.interpolate()[1] == [ref('port')], 'callers cannot mutate the memo'
+  assert processes[3] is processes[3]
+  assert processes[3].cmdline() == String('p3 {{port}}')
+
+  # bind/copy produce new objects with their own memo.
+  bound = processes.bind(port = 8080)
+  assert bound.interpolate()[0] is not first
+  assert bound[3].cmdline() == String('p3 8080')
+  assert processes[3].cmdline() == String('p3 {{port}}')
+
+  # Checking shares the memo, in either order.
+  checked = processes.bind(port = 80)
+  with Instrumentation.instrumented():
+    interpolated, _ = checked.interpolate()
+    resolves = Instrumentation.snapshot()['counters']['parser.resolve']
+    assert checked.check().ok()
+    assert Instrumentation.snapshot()['counters']['parser.resolve'] == resolves
+  assert checked.render()[0] is interpolated
+  failing = List(Integer)(['{{port}}']).bind(port = 'http')
+  assert not failing.check().ok()
+  with pytest.raises(Object.CoercionError):
+    failing.interpolate()
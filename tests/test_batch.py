@@ -0,0 +1,73 @@
+import pytest
+from pystachio import Environment, Integer, List, Map, Ref, Required, String, Struct, render_many
+from pystachio.base import Object
+
+
+class Resources(Struct):
+  cpu = Required(Integer)
+
+
+class Process(Struct):
+  name = Required(String)
+  cmdline = String
+  resources = Resources
+  env = Map(String, String)
+
+
+class Job(Struct):
+  name = String
+  processes = List(Process)
+
+
+def make_objects(count):
+  objects = []
+  for k in range(count):
+    process = Process(
+      name = 'p{{index}}',
+      cmdline = 'run --job={{job.name}} --port={{ports.http}} {{unbound}}',
+      resources = Resources(cpu = '{{ncpu}}'),
+      env = {'INDEX': '{{index}}'}).bind(index=k, ncpu=k % 4)
+    objects.append(process)
+  objects.append(Job(name='{{job.name}}', processes=objects[:2]))
+  objects.append(List(String)(['{{job.name}}', 'b']))
+  return objects
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_render_many(workers):
+  objects = make_objects(20)
+  environment = Environment(job=Job(name='deploy'), ports={'http': 8080})
+  rendered = render_many(objects, environment, workers=workers, chunksize=3)
+  assert len(rendered) == len(objects)
+  for obj, (interpolated, unbound) in zip(objects, rendered):
+    expected, expected_unbound = obj.bind(environment).interpolate()
+    assert interpolated == expected
+    assert sorted(map(str, unbound)) == sorted(map(str, expected_unbound))
+  assert rendered[5][0].cmdline().get() == 'run --job=deploy --port=8080 {{unbound}}'
+  assert rendered[5][0].resources().cpu() == Integer(1)
+  assert rendered[5][1] == [Ref.from_address('unbound')]
+
+
+def test_render_many_nested_scopes():
+  # Objects in scopes keep their own bindings, however deeply nested.
+  inner = Process(name = 'inner', cmdline = '{{port}}').bind(port = 8080)
+  outer = Job(name = '{{w.cmdline}}').bind(w = inner)
+  objects = [
+    Process(name = 'p', cmdline = 'run {{x.cmdline}}').bind(x = inner),
+    Job(name = '{{y.name}}').bind(y = outer),
+    Job(name = '{{z.cmdline}}'),
+    Job(name = '{{v.name}}').in_scope(outer),
+  ]
+  environment = {'z': inner}
+  serial = render_many(objects, environment, workers=1)
+  assert serial == render_many(objects, environment, workers=2)
+  assert [interpolated.name() for interpolated, _ in serial[1:3]] == [String('8080')] * 2
+  assert serial[0][0].cmdline() == String('run 8080')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_render_many_errors(workers):
+  objects = make_objects(3) + [Resources(cpu='{{ncpu}}').bind(ncpu='abc')]
+  with pytest.raises(Object.InterpolationError) as exc_info:
+    render_many(objects, {'job': {'name': 'x'}}, workers=workers)
+  assert 'object 5' in str(exc_info.value)
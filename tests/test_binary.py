@@ -0,0 +1,73 @@
+import json
+import marshal
+
+import pytest
+from pystachio import Default, Float, Integer, List, Map, Required, String, Struct
+from pystachio import binary
+
+
+class Resources(Struct):
+  cpu = Required(Float)
+  ram = Integer
+  disk = Default(Integer, 1024)
+
+
+class Process(Struct):
+  name = Required(String)
+  resources = Resources
+  env = Map(String, String)
+  ports = List(Integer)
+
+
+def test_round_trip():
+  process = Process(
+    name = '{{prefix}}_hello',
+    resources = Resources(cpu = 1.5),
+    env = {'HOME': '/home/{{prefix}}', 'EMPTY': ''},
+    ports = [80, 443]).bind(prefix='web')
+  data = binary.dumps(process)
+  assert data.startswith(binary.MAGIC)
+
+  loaded = binary.loads(data)
+  assert loaded == process.interpolate()[0]
+  assert json.loads(loaded.json_dumps()) == json.loads(process.json_dumps())
+  assert not loaded.resources().has_ram()
+  assert loaded.resources().disk() == Integer(1024)
+
+  unbound = Process(name = '{{unbound}}', ports = [])
+  assert binary.loads(binary.dumps(unbound)).name() == String('{{unbound}}')
+
+
+def test_many():
+  objects = [Process(name='p%d' % k, ports=list(range(k))) for k in range(10)]
+  objects.append(Resources(cpu=0.5))
+  objects.append(List(String)(['a', 'b']))
+  data = binary.dumps_many(objects)
+  assert data.count(b'"Process"') == 1
+  assert binary.loads_many(data) == objects
+
+  # Schemas are loaded by type, not by the order in which the class declares its fields.
+  class Reordered(Struct):
+    disk = Default(Integer, 1024)
+    cpu = Required(Float)
+    ram = Integer
+  assert Reordered.serialize_type()[2] == Resources.serialize_type()[2]
+
+
+def test_decode_errors():
+  data = binary.dumps(Resources(cpu = 1.0))
+  for corrupt in (b'', b'PYST', b'JSON' + data[4:], data[:6] + b'\x00', data[:-1],
+                  binary.dumps_many([])):
+    with pytest.raises(binary.DecodeError):
+      binary.loads(corrupt)
+  with pytest.raises(binary.DecodeError):
+    binary.loads(data[:4] + b'\x00\x02' + data[6:])
+
+  header = data[:6]
+  schema = json.dumps(Resources.serialize_type())
+  for payload in (5, (('{',), ()), ((schema,), 5), ((schema,), (5,)),
+                  ((schema,), ((1, ()),)), ((schema,), ((0, 5),))):
+    with pytest.raises(binary.DecodeError):
+      binary.loads_many(header + marshal.dumps(payload))
+  with pytest.raises(binary.DecodeError):
+    binary.loads(header + b'\xff' * 8)
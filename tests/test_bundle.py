@@ -0,0 +1,115 @@
+import os
+import pickle
+
+from pystachio import Default, Integer, List, Map, Required, String, Struct, TypeFactory
+from pystachio.bundle import SchemaBundle, main
+
+
+class Resources(Struct):
+  cpu = Required(Integer)
+  labels = Map(String, String)
+
+
+class Process(Struct):
+  name = Default(String, 'hello')
+  resources = Resources
+
+
+class Task(Struct):
+  processes = List(Process)
+  resources = Resources
+
+
+def write_schemas(tmpdir):
+  filenames = []
+  for typ in (Process, Task):
+    filename = str(tmpdir.join('%s.json' % typ.__name__))
+    with open(filename, 'w') as fp:
+      typ.dump(fp)
+    filenames.append(filename)
+  return filenames
+
+
+def test_bundle(tmpdir):
+  filenames = write_schemas(tmpdir)
+  cache_dir = str(tmpdir.join('cache'))
+
+  bundle = SchemaBundle(filenames, cache_dir)
+  types = bundle.load()
+  assert not bundle.cached
+  assert os.path.exists(bundle.artifact)
+  assert set(['parse', 'write', 'reify']) <= set(bundle.timings)
+  assert set(types) >= set(['Process', 'Task', 'Resources', 'ProcessList', 'StringStringMap'])
+  assert types['Task'].serialize_type() == Task.serialize_type()
+  # Types shared by schemas in a bundle are reified once.
+  assert types['Task'].TYPEMAP['resources'].klazz is types['Resources']
+  assert types['Process'].TYPEMAP['resources'].klazz is types['Resources']
+
+  bundle = SchemaBundle(filenames, cache_dir)
+  cached_types = bundle.load()
+  assert bundle.cached
+  assert 'parse' not in bundle.timings
+  assert dict((name, typ.serialize_type()) for name, typ in cached_types.items()) == (
+      dict((name, typ.serialize_type()) for name, typ in types.items()))
+
+  # Changing a schema invalidates the bundle.
+  artifact = bundle.artifact
+  with open(filenames[0], 'w') as fp:
+    Resources.dump(fp)
+  bundle = SchemaBundle(filenames, cache_dir)
+  bundle.load()
+  assert not bundle.cached
+  assert bundle.artifact != artifact
+
+  # A corrupt artifact is recompiled.
+  with open(bundle.artifact, 'wb') as fp:
+    fp.write(b'garbage')
+  bundle = SchemaBundle(filenames, cache_dir)
+  assert bundle.load()['Task'].serialize_type() == Task.serialize_type()
+  assert not bundle.cached
+
+  # As is an artifact that unpickles to anything but valid type tuples.
+  for value in (42, (42, 42), (('Struct',), ('Struct',)), (('Struct', 'Task', 42),) * 2):
+    with open(bundle.artifact, 'wb') as fp:
+      pickle.dump(value, fp)
+    bundle = SchemaBundle(filenames, cache_dir)
+    assert bundle.load()['Task'].serialize_type() == Task.serialize_type()
+    assert not bundle.cached
+  # The recompiled artifact replaced the invalid one.
+  bundle = SchemaBundle(filenames, cache_dir)
+  bundle.load()
+  assert bundle.cached
+
+
+def test_load_file_cache_dir(tmpdir, capsys):
+  filename = write_schemas(tmpdir)[1]
+  cache_dir = str(tmpdir.join('cache'))
+  assert TypeFactory.load_file(filename, cache_dir=cache_dir)['Task'].serialize_type() == (
+      TypeFactory.load_file(filename)['Task'].serialize_type())
+  assert TypeFactory.load_file(filename, cache_dir=cache_dir)['Task'].serialize_type() == (
+      Task.serialize_type())
+  assert len(os.listdir(cache_dir)) == 1
+
+  assert main(['--cache-dir', cache_dir, filename]) == 0
+  out, _ = capsys.readouterr()
+  assert 'Loaded cached bundle of 1 schemas' in out
+  assert 'reify' in out
+
+
+def test_unwritable_cache_dir(tmpdir, capsys):
+  filename = write_schemas(tmpdir)[1]
+  not_a_directory = str(tmpdir.join('cache'))
+  with open(not_a_directory, 'w') as fp:
+    fp.write('not a directory')
+
+  bundle = SchemaBundle([filename], not_a_directory)
+  assert bundle.load()['Task'].serialize_type() == Task.serialize_type()
+  assert not bundle.cached
+  assert bundle.artifact is None
+  assert isinstance(bundle.write_error, (IOError, OSError))
+  assert TypeFactory.load_file(filename, cache_dir=not_a_directory)['Task'].serialize_type() == (
+      Task.serialize_type())
+
+  assert main(['--cache-dir', not_a_directory, filename]) == 0
+  out, _ = capsys.readouterr()
+  assert 'not cached' in out
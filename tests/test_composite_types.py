@@ -3,6 +3,7 @@ from pystachio.basic import *
 from pystachio.composite import *
 from pystachio.container import Map, List
 from pystachio.naming import Ref
+from pystachio.typing import TypeFactory
 
 def ref(address):
   return Ref.from_address(address)
@@ -303,3 +304,248 @@ def test_getattr_bad_cases():
 
   with pytest.raises(AttributeError):
     t.this_should_properly_raise
+
+
+def test_copies_do_not_alias():
+  class Employee(Struct):
+    first = String
+    last = String
+
+  brian = Employee(first = 'brian')
+  bound = brian.bind(foo = 'bar')
+  wickman = bound(last = 'wickman')
+  assert brian == Employee(first = 'brian')
+  assert bound == Employee(first = 'brian')
+  assert wickman == Employee(first = 'brian', last = 'wickman')
+  assert not brian.has_last()
+
+
+def test_lazy_accessors():
+  class Process(Struct):
+    name = String
+    cmdline = String
+    env = Map(String, String)
+
+  class Task(Struct):
+    name = String
+    processes = List(Process)
+
+  calls = []
+  class Counting(String):
+    def _interpolate(self):
+      calls.append(self._value)
+      return String._interpolate(self)
+
+  processes = [Process(name = 'p%d' % k, cmdline = Counting('run {{name}} in {{task}}'),
+                       env = {'{{name}}_HOME': '/{{name}}'})
+               for k in range(10)]
+  task = Task(name = 'hello', processes = processes).bind(task = 'hello')
+
+  lazy = task.lazy()
+  assert lazy.processes()[3].name() == String('p3')
+  assert lazy.processes()[3].cmdline().get() == 'run p3 in hello'
+  assert lazy.processes()[3].env()['p3_HOME'] == String('/p3')
+  assert calls == ['run {{name}} in {{task}}'], 'only the touched leaf should be interpolated'
+  assert [p.name().get() for p in lazy.processes()[1:3]] == ['p1', 'p2']
+  assert [p.name().get() for p in lazy.processes()][-1] == 'p9'
+  assert len(calls) == 1
+
+  # eager accessors interpolate the path, and both agree on values
+  assert task.processes()[3].cmdline() == lazy.processes()[3].cmdline()
+  assert task.processes()[3] == lazy.processes()[3]
+  assert lazy.bind(task = 'other').processes()[0].cmdline().get() == 'run p0 in other'
+
+
+def test_struct_layout():
+  class Resources(Struct):
+    cpu = Required(Float)
+    ram = Default(Integer, 1024)
+    disk = Integer
+
+  assert set(Resources.FIELDS) == set(['cpu', 'ram', 'disk'])
+  assert [Resources.FIELDS[index] for index in Resources.REQUIRED_FIELDS] == ['cpu']
+  assert Resources.FIELD_TYPES[Resources.FIELD_INDEX['ram']] is Integer
+  assert Resources.DEFAULTS[Resources.FIELD_INDEX['disk']] is Empty
+
+  r = Resources(cpu = 1.0)
+  for obj in (r, r.bind(foo = 'bar'), r(disk = 10), r.cpu(), List(Resources)([r]),
+              Map(String, Resources)({'r': r})):
+    assert not hasattr(obj, '__dict__')
+  assert r._values[Resources.FIELD_INDEX['ram']] == Integer(1024)
+  assert r(disk = 10).disk() == Integer(10)
+  assert not r.has_disk()
+  assert r == Resources(cpu = 1.0, ram = 1024)
+  assert not Resources().check().ok()
+  assert 'cpu' in Resources().check().message()
+
+  # classes with the same TYPEMAP but a different field order still compare equal
+  reified = TypeFactory.new({}, *Resources.serialize_type())
+  assert reified(cpu = 1.0, disk = 5) == Resources(cpu = 1.0, disk = 5)
+
+  # the self scope is built once and kept, but memoized interpolations keep no
+  # scopes on their leaves
+  bound = Resources(cpu = '{{ncpu}}', disk = '{{ndisk}}').bind(ncpu = 2, ndisk = 10)
+  interpolated, _ = bound.interpolate()
+  environment = bound._self_environment
+  assert environment is not None
+  assert bound.cpu() == Float(2.0)
+  assert bound.bind(ncpu = 3)._self_environment is environment
+  for name in ('cpu', 'disk'):
+    assert len(interpolated._values[Resources.FIELD_INDEX[name]].scope_chain()) == 0
+  assert bound.check().ok()
+
+
+def test_render_single_pass():
+  class Resources(Struct):
+    cpu = Required(Float)
+
+  class Process(Struct):
+    name = Required(String)
+    resources = Resources
+
+  process = Process(name='{{x}}', resources=Resources(cpu='{{ncpu}}')).bind(x='hello', ncpu=1)
+  interpolated, unbound, typecheck = process.render()
+  assert typecheck.ok()
+  assert unbound == []
+  assert interpolated.resources().cpu() == Float(1.0)
+  assert process.interpolate()[0] is interpolated
+  assert process.check() is typecheck
+
+  process = Process(name='hello', resources=Resources(cpu='{{ncpu}}')).bind(ncpu='abc')
+  interpolated, unbound, typecheck = process.render()
+  assert interpolated is None
+  assert not typecheck.ok()
+  assert 'Process[resources] failed' in typecheck.message()
+  with pytest.raises(Object.CoercionError):
+    process.interpolate()
+
+  interpolated, unbound, typecheck = Process(resources=Resources(cpu='{{ncpu}}')).render()
+  assert not typecheck.ok()
+  assert 'is required' in typecheck.message()
+  assert unbound == [Ref.from_address('ncpu')]
+
+  # The first failing field, in field order, is reported.
+  class Task(Struct):
+    a = String
+    procs = List(Process)
+    z = Required(String)
+
+  class Job(Struct):
+    a = Required(String)
+    procs = List(Process)
+
+  procs = [Process(name='hello'), Process(resources=Resources(cpu=1))]
+  assert Task(procs=procs).check().message().startswith('Task[procs] failed')
+  assert Task(procs=procs).render()[2].message().startswith('Task[procs] failed')
+  assert Job(procs=procs).check().message() == 'Job[a] is required.'
+
+
+class PickledResources(Struct):
+  cpu = Required(Float)
+
+
+@Provided(resources=PickledResources)
+class PickledProcess(Struct):
+  name = String
+  cmdline = Default(String, 'run {{name}} --cpu={{resources.cpu}}')
+
+
+def test_pickling_module_level_structs():
+  import pickle
+
+  assert PickledProcess.__module__ == __name__
+  for protocol in range(0, pickle.HIGHEST_PROTOCOL + 1):
+    assert pickle.loads(pickle.dumps(PickledResources, protocol)) is PickledResources
+    assert pickle.loads(pickle.dumps(PickledProcess, protocol)) is PickledProcess
+    process = PickledProcess(name='hello').bind(resources=PickledResources(cpu=1))
+    unpickled = pickle.loads(pickle.dumps(process, protocol))
+    assert unpickled.__class__ is PickledProcess
+    assert unpickled.cmdline() == String('run hello --cpu=1.0')
+
+
+def test_pickling():
+  import pickle
+  from pystachio.base import Environment
+
+  class Resources(Struct):
+    cpu = Required(Float)
+    labels = Map(String, List(Integer))
+
+  @Provided(mesos=Resources)
+  class Process(Struct):
+    name = Default(String, 'hello')
+    resources = Resources
+    cmdline = String
+
+  process = Process(
+    cmdline = 'run {{name}} --cpu={{resources.cpu}} --port={{mesos.port}}',
+    resources = Resources(cpu='{{ncpu}}', labels={'a': [1, 2]}).bind(ncpu=1.5)
+  ).bind(Environment(mesos={'port': 8080}))
+
+  for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+    data = pickle.dumps(process, protocol)
+    unpickled = pickle.loads(data)
+    assert unpickled.__class__ is not Process
+    assert unpickled.__class__.serialize_type() == Process.serialize_type()
+    assert isinstance(unpickled, Process)
+    assert unpickled == process
+    assert unpickled.cmdline() == String('run hello --cpu=1.5 --port=8080')
+    assert unpickled.check().ok()
+
+    # Types are reconstructed once while they are alive.
+    assert pickle.loads(data).__class__ is unpickled.__class__
+    assert pickle.loads(pickle.dumps(Process, protocol)) is unpickled.__class__
+    assert pickle.loads(pickle.dumps(List(Process), protocol)).TYPE is unpickled.__class__
+
+  assert pickle.loads(pickle.dumps(String('{{x}}').bind(x=1))) == String('1')
+  empty = pickle.loads(pickle.dumps(Resources()))
+  assert not empty.has_cpu()
+
+
+def test_free_refs():
+  class Resources(Struct):
+    cpu = Float
+
+  @Provided(mesos=Resources)
+  class Process(Struct):
+    name = String
+    cmdline = String
+    resources = Resources
+    env = Map(String, String)
+
+  class Task(Struct):
+    name = String
+    processes = List(Process)
+
+  process = Process(
+    name = '{{task}}_{{id}}',
+    cmdline = 'run {{name}} --cpu={{resources.cpu}} --mesos={{mesos.cpu}} {{&escaped}}',
+    resources = Resources(cpu = '{{ncpu}}'),
+    env = {'PORT': '{{port}}'})
+  task = Task(name='{{task}}', processes=[process.bind(id=0), process.bind(id=1, ncpu=2)])
+
+  free = task.free_refs()
+  assert dict((key, sorted(paths)) for key, paths in free.items()) == {
+    ref('task'): ['name', 'processes[0].cmdline', 'processes[0].name',
+                  'processes[1].cmdline', 'processes[1].name'],
+    ref('ncpu'): ['processes[0].cmdline', 'processes[0].resources.cpu'],
+    ref('port'): ['processes[0].env[PORT]', 'processes[1].env[PORT]'],
+  }
+  assert set(free) == set(task.interpolate()[1])
+
+  bound = task.bind(task='hello', ncpu=1)
+  assert bound.free_refs() == {ref('port'): ['processes[0].env[PORT]', 'processes[1].env[PORT]']}
+  assert bound.bind(port=80).free_refs() == {}
+
+  # Templated Map keys are reported as they interpolate.
+  env = Map(String, String)({'{{kname}}': '{{port}}'})
+  assert env.bind(kname='PORT').free_refs() == {ref('port'): ['[PORT]']}
+  assert env.free_refs() == {ref('kname'): ['[{{kname}}]'], ref('port'): ['[{{kname}}]']}
+  ports = Map(Integer, String)({'{{kname}}': '{{port}}'}).bind(kname='http')
+  assert ports.free_refs() == {ref('port'): ['[{{kname}}]']}
+  assert not ports.check().ok()
+
+  # Substitutions that form new templates are resolved.
+  assert String('{{a[{{b}}]}}').bind(b='c').free_refs() == {ref('a[c]'): ['']}
+  with pytest.raises(MustacheParser.Uninterpolatable):
+    String('{{a}}').bind(a='{{b}}', b='{{a}}').free_refs()
@@ -171,7 +171,6 @@ def test_map_idioms():
       mi[key]
     assert key not in mi
 
-@pytest.mark.xfail(reason="Pre-coercion checks need to be improved.")
 def test_map_keys_that_should_improve():
   mi = Map(String, Integer)()
   for key in [{2: "hello"}, String, Integer, type]:
@@ -252,3 +251,34 @@ def test_load_json_fp():
         assert p == Process.json_load(fp)
     finally:
       os.unlink(fn)
+
+
+def test_map_indexed_lookups():
+  big = Map(String, Integer)(dict(('key%d' % k, k) for k in range(1000)))
+  assert big['key500'] == Integer(500)
+  assert big[String('key999')] == Integer(999)
+  assert 'key0' in big
+  assert 'key1000' not in big
+  with pytest.raises(KeyError):
+    big['key1000']
+  assert big.find(ref('[key42]')) == Integer(42)
+  with pytest.raises(Namable.NotFound):
+    big.find(ref('[key1000]'))
+
+  # keys are compared by their interpolated values
+  templated = Map(String, Integer)({'{{prefix}}_a': 1, 'b': 2}).bind(prefix = 'x')
+  assert templated['x_a'] == Integer(1)
+  assert '{{prefix}}_a' not in templated
+
+  # the first entry wins for duplicate keys, as with the original linear scan
+  dupes = Map(Integer, String)((1, 'first'), ('1', 'second'))
+  assert dupes[1] == String('first')
+  assert dupes.find(ref('[1]')) == String('first')
+  assert 'abc' not in dupes
+
+  # coercion failures while interpolating values are not reported as missing keys
+  broken = Map(String, Integer)({'a': '{{x}}'}).bind(x = 'abc')
+  with pytest.raises(Integer.CoercionError):
+    broken['a']
+  with pytest.raises(Integer.CoercionError):
+    'a' in broken
@@ -0,0 +1,70 @@
+from pystachio import Environment, Integer, List, String, Struct
+from pystachio.instrumentation import Instrumentation
+
+
+class Process(Struct):
+  name = String
+  cmdline = String
+  port = Integer
+
+
+class Job(Struct):
+  name = String
+  processes = List(Process)
+
+
+def make_job():
+  return Job(name = 'job', processes = [
+    Process(name = 'p{{index}}', cmdline = 'run --port={{ports.http}}', port = '{{ports.http}}')
+    for index in range(3)])
+
+
+def test_disabled_by_default():
+  Instrumentation.reset()
+  assert not Instrumentation.enabled()
+  make_job().bind(ports={'http': 80}).interpolate()
+  snapshot = Instrumentation.snapshot()
+  assert snapshot['counters'] == {}
+  assert snapshot['timers'] == {}
+
+
+def test_counters_and_timers():
+  with Instrumentation.instrumented():
+    assert Instrumentation.enabled()
+    job = make_job().bind(Environment(ports={'http': 80}), index=0)
+    job.interpolate()
+    job.interpolate()
+  assert not Instrumentation.enabled()
+
+  snapshot = Instrumentation.snapshot()
+  counters, timers = snapshot['counters'], snapshot['timers']
+  assert counters['interpolate.Job'] == 2
+  assert counters['interpolate.Process'] == 3
+  assert counters['interpolate.ProcessList'] == 1
+  assert counters['copy'] > 0
+  assert counters['parser.resolve'] >= 9
+  assert counters['parser.resolve.iterations'] >= counters['parser.resolve']
+  assert counters['parser.split'] >= counters['parser.resolve']
+  assert counters['environment.find.miss'] > 0
+  assert counters['environment.find'] > counters['environment.find.miss']
+  assert set(timers) == set(name for name in counters if name.startswith('interpolate.'))
+  assert timers['interpolate.Job'] >= timers['interpolate.ProcessList'] > 0
+
+  for name in ('parser.splits', 'ref.interned', 'type_environment.merge'):
+    assert set(snapshot['caches'][name]) == set(['hits', 'misses', 'size', 'capacity'])
+
+  with Instrumentation.instrumented():
+    pass
+  snapshot = Instrumentation.snapshot()
+  assert snapshot['counters'] == {}
+  assert snapshot['caches']['parser.splits']['hits'] == 0
+  assert snapshot['caches']['parser.splits']['misses'] == 0
+
+
+def test_check_is_instrumented():
+  with Instrumentation.instrumented():
+    assert make_job().bind(Environment(ports={'http': 80}), index=0).check().ok()
+  snapshot = Instrumentation.snapshot()
+  for name in ('interpolate.Job', 'interpolate.ProcessList', 'interpolate.Process'):
+    assert snapshot['counters'][name] >= 1
+    assert snapshot['timers'][name] > 0
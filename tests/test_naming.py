@@ -40,6 +40,27 @@ def test_ref_parsing():
       ref(refstr)
 
 
+def test_ref_interning():
+  assert ref('a.b[0]') is ref('a.b[0]')
+  assert ref('a') is not ref('b')
+  assert ref('.a') == ref('a')
+  assert ref('a.b').rest() is ref('a.b').rest()
+  assert ref('a.b').rest() == ref('b')
+  assert hash(ref('a.b').rest()) == hash(ref('b'))
+  assert len(set([ref('a'), Ref([Ref.Dereference('a')]), ref('a') + ref('[0]').rest()])) == 1
+  assert ref('a') != ref('[a]')
+  assert ref('a.b').components() == (Ref.Dereference('a'), Ref.Dereference('b'))
+  assert ref('a.b').address() == 'a.b'
+  assert str(ref('[0].a')) == '{{[0].a}}'
+  assert deepcopy(ref('a.b')) is ref('a.b')
+  with pytest.raises(AttributeError):
+    ref('a').foo = 'bar'
+
+  import pickle
+  for address in ('a', 'a.b[0]', '[x].y'):
+    assert pickle.loads(pickle.dumps(ref(address))) == ref(address)
+
+
 
 def test_ref_lookup():
   oe = Environment(a = 1)
@@ -104,3 +104,71 @@ def test_mustache_resolve_cycles():
     MustacheParser.resolve('{{foo[{{bar}}]}} {{baz}}',
        Environment(foo = List(String)(["{{foo[{{bar}}]}}", "world"])), Environment(bar = 0))
 
+
+def test_mustache_template_cache():
+  MustacheParser.clear_cache()
+  template = 'hello {{name}}, welcome to {{place}}'
+  first = MustacheParser.split(template)
+  second = MustacheParser.split(template)
+  assert first == second == ['hello ', ref('name'), ', welcome to ', ref('place')]
+  stats = MustacheParser.cache_stats()
+  assert stats['misses'] == 1
+  assert stats['hits'] == 1
+
+  # split hands out copies so callers cannot corrupt the cache.
+  first.append('garbage')
+  assert MustacheParser.split(template) == second
+
+  # keep_aliases produces a different tokenization and is cached separately.
+  assert MustacheParser.split('{{&foo}}') == ['{{foo}}']
+  assert MustacheParser.split('{{&foo}}', keep_aliases=True) == ['{{&foo}}']
+
+  # invalid templates are not cached.
+  for _ in range(2):
+    with pytest.raises(Ref.InvalidRefError):
+      MustacheParser.split('{{4}}')
+  assert MustacheParser.cache_stats()['misses'] == 5
+
+  # join accepts template strings directly.
+  joined, unbound = MustacheParser.join(template, Environment(name='brian'))
+  assert joined == 'hello brian, welcome to {{place}}'
+  assert unbound == [ref('place')]
+
+
+def test_mustache_template_cache_bounded():
+  try:
+    MustacheParser.set_cache_size(2)
+    MustacheParser.clear_cache()
+    for k in range(10):
+      MustacheParser.split('{{foo%d}}' % k)
+    assert MustacheParser.cache_stats()['size'] == 2
+    MustacheParser.set_cache_size(0)
+    assert MustacheParser.cache_stats()['size'] == 0
+    assert MustacheParser.split('{{foo}}') == [ref('foo')]
+    assert MustacheParser.cache_stats()['size'] == 0
+    with pytest.raises(ValueError):
+      MustacheParser.set_cache_size(-1)
+  finally:
+    MustacheParser.set_cache_size(MustacheParser.DEFAULT_CACHE_SIZE)
+
+
+def test_mustache_resolve_aliases_and_nesting():
+  # aliases produced by substitution are preserved rather than re-resolved.
+  oe = Environment(foo = '{{&bar}}', bar = 'hello')
+  assert MustacheParser.resolve('{{foo}} {{bar}}', oe) == ('{{bar}} hello', [])
+
+  # substitution may assemble a brand new template out of surrounding braces.
+  oe = Environment(name = 'bar', bar = 'hello')
+  assert MustacheParser.resolve('{{{{name}}}}', oe) == ('hello', [])
+
+  # unbound refs are reported once per occurrence in order.
+  resolved, unbound = MustacheParser.resolve('{{a}} {{b}} {{a}}', Environment(b = '{{a}}'))
+  assert resolved == '{{a}} {{a}} {{a}}'
+  assert unbound == [ref('a'), ref('a'), ref('a')]
+
+
+def test_mustache_resolve_self_reference():
+  with pytest.raises(MustacheParser.Uninterpolatable):
+    MustacheParser.resolve('{{foo}}', Environment(foo = 'x{{foo}}'))
+  with pytest.raises(MustacheParser.Uninterpolatable):
+    MustacheParser.resolve('{{foo}}', Environment(foo = '{{bar}}', bar = '{{foo}}'))
@@ -0,0 +1,91 @@
+from pystachio import Environment, Integer, List, Map, Ref, RenderSession, String, Struct
+
+
+class Resources(Struct):
+  cpu = Integer
+  ram = Integer
+
+
+class Process(Struct):
+  name = String
+  cmdline = String
+  resources = Resources
+
+
+class Job(Struct):
+  name = String
+  cluster = String
+  processes = List(Process)
+  env = Map(String, String)
+
+
+def make_job():
+  return Job(
+    name = 'job-{{mesos.instance}}',
+    cluster = '{{cluster.name}}',
+    processes = [
+      Process(name = 'p{{index}}-{{mesos.instance}}',
+              cmdline = 'run --version={{cluster.version}} {{name}}',
+              resources = Resources(cpu = '{{ncpu}}', ram = 1024)).bind(index=k)
+      for k in range(4)],
+    env = {'CLUSTER': '{{cluster.name}}', 'USER': 'root'})
+
+
+def field(struct, name):
+  return struct._values[struct.FIELD_INDEX[name]]
+
+
+def test_render_matches_interpolate():
+  bindings = {'mesos': {'instance': 3}, 'cluster': {'name': 'west', 'version': '1.2'}}
+  session = RenderSession(make_job(), bindings)
+  assert session.render() == make_job().bind(bindings).interpolate()
+
+  interpolated, unbound = RenderSession(make_job()).render()
+  expected, expected_unbound = make_job().interpolate()
+  assert interpolated == expected
+  assert set(unbound) == set(expected_unbound)
+  assert Ref.from_address('ncpu') in unbound
+
+
+def test_update_rerenders_only_affected_values():
+  session = RenderSession(make_job(), {'cluster': {'name': 'west', 'version': '1.2'}},
+      ncpu=1, mesos={'instance': 0})
+  first, _ = session.render()
+
+  updated, unbound = session.update({'cluster': {'version': '1.3'}})
+  assert unbound == []
+  assert session.rendered == 4
+  assert updated == make_job().bind(session.environment).interpolate()[0]
+  assert updated.processes()[0].cmdline() == String('run --version=1.3 p0-0')
+  # Values that did not look up cluster.version are shared with the first render.
+  assert field(updated, 'name') is field(first, 'name')
+  assert field(updated, 'env') is field(first, 'env')
+  assert (field(field(updated, 'processes')._values[0], 'resources') is
+          field(field(first, 'processes')._values[0], 'resources'))
+
+  # cmdline depends on mesos.instance through the Process's name.
+  updated, _ = session.update({'mesos': {'instance': 7}})
+  assert session.rendered == 9
+  assert updated.processes()[3].cmdline() == String('run --version=1.3 p3-7')
+
+  # Rebinding a prefix invalidates everything below it.
+  updated, _ = session.update(cluster={'name': 'east', 'version': '2.0'})
+  assert updated.cluster() == String('east')
+  assert updated.env()['CLUSTER'] == String('east')
+  assert updated == make_job().bind(session.environment).interpolate()[0]
+
+  previous = updated
+  updated, _ = session.update(unrelated='value')
+  assert session.rendered == 0
+  assert updated is previous
+
+
+def test_update_binds_unbound_refs():
+  session = RenderSession(make_job(), cluster={'name': 'west', 'version': '1'},
+      mesos={'instance': 0})
+  _, unbound = session.render()
+  assert unbound == [Ref.from_address('ncpu')]
+  updated, unbound = session.update(Environment(ncpu=2))
+  assert unbound == []
+  assert session.rendered == 4
+  assert [process.resources().cpu() for process in updated.processes()] == [Integer(2)] * 4
@@ -0,0 +1,119 @@
+import io
+import json
+
+import pytest
+from pystachio import Integer, List, Map, Required, String, Struct
+from pystachio.streaming import iter_json_values
+
+
+class Job(Struct):
+  name = Required(String)
+  instances = Integer
+  env = Map(String, String)
+
+
+RECORDS = [
+  {'name': 'job%d' % k, 'instances': k, 'env': {'k': 'v' * k}, 'ignored': [1, 2]}
+  for k in range(50)
+]
+
+
+def test_iter_json_values():
+  for chunk_size in (1, 2, 7, 65536):
+    array = io.StringIO(json.dumps(RECORDS))
+    assert list(iter_json_values(array, chunk_size=chunk_size)) == RECORDS
+
+    lines = io.BytesIO('\n'.join(json.dumps(record) for record in RECORDS).encode('utf-8'))
+    assert list(iter_json_values(lines, chunk_size=chunk_size)) == RECORDS
+
+    numbers = io.StringIO(' [12345, 6.75e2 , "\\u00e9", true, null] ')
+    assert list(iter_json_values(numbers, chunk_size=chunk_size)) == [
+        12345, 675.0, u'é', True, None]
+
+    literals = io.StringIO('[false, -Infinity, -1.5e-3, "\\ud83d\\ude00\\"", {"a": null}]')
+    assert list(iter_json_values(literals, chunk_size=chunk_size)) == [
+        False, float('-inf'), -1.5e-3, u'\U0001f600"', {'a': None}]
+
+  assert list(iter_json_values(io.StringIO(' [ ] '))) == []
+  assert list(iter_json_values(io.StringIO(''))) == []
+  assert list(iter_json_values(io.StringIO('123 456'), chunk_size=2)) == [123, 456]
+
+
+def test_iter_json_values_errors():
+  for document in ('[1, 2', '[1 2]', '[1, 2] 3', '{"a": ', '[1, }'):
+    with pytest.raises(ValueError):
+      list(iter_json_values(io.StringIO(document), chunk_size=3))
+
+
+class CountingReader(io.StringIO):
+  def __init__(self, *args):
+    io.StringIO.__init__(self, *args)
+    self.characters_read = 0
+
+  def read(self, size=-1):
+    chunk = io.StringIO.read(self, size)
+    self.characters_read += len(chunk)
+    return chunk
+
+
+def test_iter_json_values_malformed_input_is_not_buffered():
+  document = '\n'.join(['{"name": "job", oops}'] + [json.dumps(record) for record in RECORDS] * 20)
+  fp = CountingReader(document)
+  with pytest.raises(ValueError):
+    next(iter_json_values(fp, chunk_size=16))
+  assert fp.characters_read <= 32
+
+
+def test_iter_json_values_large_values():
+  value = {'cmdline': 'x' * 500000, 'args': list(range(20000))}
+  fp = CountingReader(json.dumps([value, 1]))
+  values = iter_json_values(fp, chunk_size=64)
+  assert next(values) == value
+  # reads grow geometrically rather than chunk by chunk
+  assert fp.tell() < 4 * len(json.dumps(value))
+  assert list(values) == [1]
+
+
+def test_json_iter():
+  jobs = Job.json_iter(io.StringIO(json.dumps(RECORDS)))
+  first = next(jobs)
+  assert first == Job(name='job0', instances=0, env={'k': ''})
+  assert len(list(jobs)) == len(RECORDS) - 1
+
+  with pytest.raises(AttributeError):
+    list(Job.json_iter(io.StringIO(json.dumps(RECORDS)), strict=True))
+
+  lines = io.StringIO('\n'.join(json.dumps(record) for record in RECORDS))
+  assert [job.instances().get() for job in List(Job).json_iter(lines)] == list(range(50))
+  assert list(List(Integer).json_iter(io.StringIO('[1, 2, 3]'))) == [
+      Integer(1), Integer(2), Integer(3)]
+
+
+def test_dump():
+  from pystachio import Float
+  from pystachio.streaming import dump, dumps
+
+  class Process(Struct):
+    name = Required(String)
+    cpu = Float
+    ports = Map(Integer, String)
+    flags = Map(Float, List(String))
+
+  process = Process(
+    name = u'{{pname}} é "quoted"',
+    cpu = '{{ncpu}}',
+    ports = {8080: 'http', 9090: '{{pname}}'},
+    flags = Map(Float, List(String))((1.5, ['a', 'b']), (1.5, []), (2, ['{{unbound}}']))
+  ).bind(pname='proc', ncpu=0.25)
+  expected = json.dumps(process.interpolate()[0].get())
+  assert dumps(process) == expected
+  assert process.json_dumps() == expected
+  assert Process.json_loads(process.json_dumps()).ports() == process.ports()
+
+  for chunk_size in (1, 16, 65536):
+    fp = io.StringIO()
+    dump(process, fp, chunk_size=chunk_size)
+    assert fp.getvalue() == expected
+
+  assert dumps(List(Job)([])) == '[]'
+  assert dumps(Job()) == '{}'
@@ -0,0 +1,101 @@
+import json
+import threading
+
+from pystachio import Environment, Map, Ref, String, Struct, List
+from pystachio.tracing import ResolutionTracer
+
+
+class Process(Struct):
+  name = String
+  cmdline = String
+
+
+class Job(Struct):
+  name = String
+  processes = List(Process)
+  env = Map(String, String)
+
+
+class Cluster(Struct):
+  name = String
+  version = String
+
+
+def make_job():
+  return Job(
+    name = 'job',
+    processes = [Process(name = 'hello', cmdline = 'run --version={{cluster.version}} {{name}}')],
+    env = {'SECRET': '{{secret}}'})
+
+
+def test_trace_records_scope_and_path():
+  job = make_job().bind(
+      Environment(cluster = Cluster(name = 'west', version = '1.2')),
+      Environment(unused = 'x'))
+  with ResolutionTracer.trace() as tracer:
+    interpolated, unbound = job.interpolate()
+  assert unbound == [Ref.from_address('secret')]
+  assert ResolutionTracer.current() is None
+
+  records = dict(((record['path'], record['ref']), record) for record in tracer.records)
+  version = records[('processes[0].cmdline', 'cluster.version')]
+  # Probed the Process, the Job and the later (so higher priority) binding first.
+  assert version['scope'] == 3
+  assert version['scope_type'] == 'Environment'
+  assert version['mount'] == 'cluster'
+  assert version['probes'] == 3
+  assert version['seconds'] >= 0
+
+  name = records[('processes[0].cmdline', 'name')]
+  assert (name['scope'], name['scope_type'], name['mount'], name['probes']) == (
+      0, 'Environment', 'name', 0)
+
+  secret = records[('env[SECRET]', 'secret')]
+  assert secret['scope'] is None and secret['mount'] is None
+  assert secret['probes'] == 3
+
+  lines = tracer.dumps().splitlines()
+  assert len(lines) == len(tracer.records)
+  assert json.loads(lines[0]) == tracer.records[0]
+
+
+def test_trace_templated_map_keys():
+  job = Job(name = 'job', env = {'{{kname}}': '{{port}}'}).bind(kname = 'PORT', port = 80)
+  with ResolutionTracer.trace() as tracer:
+    job.interpolate()
+  assert sorted((record['path'], record['ref']) for record in tracer.records) == [
+      ('env', 'kname'), ('env[PORT]', 'port')]
+
+
+def test_trace_memoized_interpolation():
+  job = make_job().bind(cluster = Cluster(version = '1.2'))
+  interpolated, unbound = job.interpolate()
+  for method in (job.interpolate, job.check):
+    with ResolutionTracer.trace() as tracer:
+      method()
+    assert ('processes[0].cmdline', 'cluster.version') in set(
+        (record['path'], record['ref']) for record in tracer.records)
+  assert job.interpolate()[0] is interpolated
+
+
+def test_trace_is_per_thread():
+  results = []
+
+  def interpolate():
+    results.append(ResolutionTracer.current())
+    make_job().interpolate()
+
+  with ResolutionTracer.trace() as tracer:
+    thread = threading.Thread(target=interpolate)
+    thread.start()
+    thread.join()
+  assert results == [None]
+  assert tracer.records == []
+
+
+def test_find_mount():
+  environment = Environment(cluster = Cluster(name = 'west'), user = 'root')
+  assert environment.find_mount(Ref.from_address('user')) == (Ref.from_address('user'), 'root')
+  key, value = environment.find_mount(Ref.from_address('cluster.name'))
+  assert key == Ref.from_address('cluster')
+  assert value == String('west')
@@ -151,3 +151,88 @@ def test_unimplementeds():
     Type().check()
   with pytest.raises(NotImplementedError):
     Type.serialize_type()
+
+
+def test_canonical_registry():
+  assert Map(String, Integer) is not Map(String, Integer)
+
+  with TypeRegistry.canonical():
+    StringIntegerMap = Map(String, Integer)
+    assert Map(String, Integer) is StringIntegerMap
+    assert List(Map(String, Integer)) is List(StringIntegerMap)
+    loaded = TypeFactory.load(List(StringIntegerMap).serialize_type())
+    assert loaded['StringIntegerMapList'] is List(StringIntegerMap)
+    assert loaded['StringIntegerMap'] is StringIntegerMap
+
+    # Hits still deposit the types they depend upon.
+    type_dict = {}
+    TypeFactory.new(type_dict, *List(StringIntegerMap).serialize_type())
+    assert type_dict[StringIntegerMap.serialize_type()] is StringIntegerMap
+
+  assert not TypeRegistry.enabled()
+  assert Map(String, Integer) is not StringIntegerMap
+
+
+def test_cached_serialization():
+  class Job(Struct):
+    name = Required(String)
+    env = Default(Map(String, Integer), {'a': 1})
+
+  assert Job.serialize_type() is Job.serialize_type()
+  assert Job.type_fingerprint() == Job.type_fingerprint()
+
+  Reloaded = TypeFactory.load(Job.serialize_type())['Job']
+  assert Reloaded is not Job
+  assert Reloaded.type_fingerprint() == Job.type_fingerprint()
+  assert isinstance(Reloaded(name='x'), Job)
+  assert isinstance(Job(name='x'), Reloaded)
+
+  class Job(Struct):
+    name = Required(String)
+  assert not isinstance(Job(name='x'), Reloaded)
+  assert not isinstance(String('x'), Reloaded)
+
+
+def test_type_environment_merge():
+  from pystachio.typing import TypeEnvironment
+
+  class Job(Struct):
+    name = String
+
+  class Task(Struct):
+    id = Integer
+
+  jobs = TypeEnvironment(job=Job)
+  tasks = TypeEnvironment(Task)
+  assert jobs.merge(TypeEnvironment.EMPTY) is jobs
+  assert TypeEnvironment.EMPTY.merge(jobs) is jobs
+  assert jobs.merge(TypeEnvironment(job=Job)) is jobs
+
+  merged = jobs.merge(tasks)
+  assert merged == tasks.merge(jobs)
+  assert jobs.merge(tasks) is merged
+  assert merged.merge(jobs) is merged
+
+  assert merged.covers(ref('job.name'))
+  assert merged.covers(ref('id'))
+  assert not merged.covers(ref('job.id'))
+  assert not jobs.covers(ref('id'))
+
+
+def test_type_environment_covers_is_bounded():
+  from pystachio.typing import TypeEnvironment
+
+  class Job(Struct):
+    name = String
+
+  covers = TypeEnvironment._COVERS
+  size = len(covers)
+  for index in range(100):
+    assert not TypeEnvironment.EMPTY.covers(ref('ref%d' % index))
+  assert len(covers) == size
+
+  jobs = TypeEnvironment(job=Job)
+  assert jobs.covers(ref('job.name'))
+  assert TypeEnvironment(job=Job).covers(ref('job.name'))
+  assert covers.hits >= 1
+  assert len(covers) <= TypeEnvironment.COVERS_CACHE_SIZE